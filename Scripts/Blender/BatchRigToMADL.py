@@ -0,0 +1,204 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+#
+# Batch export without UI, runs RigToMADL_v2.py inside "blender --background", several Blender instances at once.
+# Run with regular Python (not inside Blender):
+#   python BatchRigToMADL.py manifest.json [--blender PATH] [--jobs N] [--incremental]
+#
+# Manifest is a JSON list (or {"defaults": {...}, "jobs": [...]}) of jobs:
+#   {"blend": "rigs/bt7274.blend", "rig": "BT-7274", "output": "out/bt7274.madl",
+#    "add_tex": true, "add_phy": true, "add_anim": true, "tex_type": "PNG", "vtfcmd_path": ""}
+# Relative paths are relative to the manifest. "output" defaults to <blend name>_<rig>.madl next to the manifest.
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+EXPORTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RigToMADL_v2.py")
+# Parts of the reader package the exporter writes with
+SHARED = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Python", "madl", name) for name in ("model.py", "structs.py", "quat.py")]
+
+OPTIONS = {
+    "add_tex": True,
+    "add_phy": False,
+    "phy_hull": True,
+    "phy_max_vertices": 64,
+    "phy_weld": 0.001,
+    "add_anim": False,
+    "anim_tolerance": 0.0005,
+    "anim_snapshot_interval": 30,
+    "anim_encoding": "HALF",
+    "anim_bits": 16,
+    "tex_type": "PNG",
+    "vtfcmd_path": "",
+    "vtf_workers": 0,
+    "vtf_timeout": 120,
+    "texture_cache_path": None,
+}
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = dict(OPTIONS, **manifest.get("defaults", {}))
+    jobs = []
+    for entry in manifest["jobs"]:
+        job = dict(defaults, **entry)
+        if "blend" not in job or "rig" not in job:
+            raise ValueError(f"{path}: every job needs \"blend\" and \"rig\": {entry}")
+        job["blend"] = os.path.join(base, job["blend"])
+        blend_name = os.path.splitext(os.path.basename(job["blend"]))[0]
+        job["output"] = os.path.join(base, job.get("output") or f"{blend_name}_{job['rig']}.madl")
+        jobs.append(job)
+    return jobs
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def source_hash(job):
+    # Everything that changes the output: the .blend, the exporter itself (and SHARED) and the export options.
+    # Images stored outside the .blend are not included, pack them or run without --incremental.
+    digest = hashlib.sha1()
+    digest.update(file_hash(job["blend"]).encode())
+    digest.update(file_hash(EXPORTER).encode())
+    for path in SHARED:
+        digest.update(file_hash(path).encode())
+    digest.update(json.dumps({k: v for k, v in job.items() if k != "blend"}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def job_key(job):
+    return f"{os.path.abspath(job['blend'])}:{job['rig']}"
+
+def command(blender, job):
+    cmd = [blender, "--background", "--factory-startup", job["blend"],
+        "--python-exit-code", "1", "--python", EXPORTER, "--",
+        "--rig", job["rig"], "--output", job["output"], "--tex-type", job["tex_type"],
+        "--vtf-workers", str(job["vtf_workers"]), "--vtf-timeout", str(job["vtf_timeout"])]
+    if not job["add_tex"]:
+        cmd.append("--no-tex")
+    if job["add_phy"]:
+        cmd.append("--phy")
+        cmd += ["--phy-max-vertices", str(job["phy_max_vertices"]), "--phy-weld", str(job["phy_weld"])]
+        if not job["phy_hull"]:
+            cmd.append("--no-phy-hull")
+    if job["add_anim"]:
+        cmd += ["--anim", "--anim-tolerance", str(job["anim_tolerance"]), "--anim-snapshot-interval", str(job["anim_snapshot_interval"]),
+            "--anim-encoding", job["anim_encoding"], "--anim-bits", str(job["anim_bits"])]
+    if job["vtfcmd_path"]:
+        cmd += ["--vtfcmd", job["vtfcmd_path"]]
+    if job["texture_cache_path"] == False:
+        cmd.append("--no-texture-cache")
+    elif job["texture_cache_path"]:
+        cmd += ["--texture-cache", job["texture_cache_path"]]
+    return cmd
+
+def run_job(blender, job, timeout):
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(command(blender, job), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        output = proc.stdout.decode("utf-8", "replace")
+        ok = proc.returncode == 0
+        error = not ok and f"Blender exited with code {proc.returncode}" or None
+    except subprocess.TimeoutExpired as e:
+        output = (e.stdout or b"").decode("utf-8", "replace")
+        ok = False
+        error = f"timed out after {timeout}s"
+    except OSError as e:
+        output = ""
+        ok = False
+        error = f"could not start Blender: {e}"
+    return {"ok": ok, "error": error, "seconds": time.perf_counter() - start, "output": output}
+
+def load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(path, state):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def batch_export(jobs, blender="blender", max_workers=0, timeout=None, incremental=False, state_path=None):
+    state = incremental and load_state(state_path) or {}
+    results = []
+    pending = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers or os.cpu_count() or 1) as executor:
+        for job in jobs:
+            name = f"{os.path.basename(job['blend'])}:{job['rig']}"
+            if not os.path.exists(job["blend"]):
+                results.append(dict(job=job, name=name, ok=False, skipped=False, seconds=0.0, error="file not found", output=""))
+                print(f"FAIL          {name}: {job['blend']} not found")
+                continue
+            job_hash = source_hash(job)
+            if incremental and state.get(job_key(job)) == job_hash and os.path.exists(job["output"]):
+                results.append(dict(job=job, name=name, ok=True, skipped=True, seconds=0.0, error=None, output=""))
+                print(f"SKIP          {name}")
+                continue
+            pending[executor.submit(run_job, blender, job, timeout)] = (job, name, job_hash)
+
+        for future in concurrent.futures.as_completed(pending):
+            job, name, job_hash = pending[future]
+            result = dict(future.result(), job=job, name=name, skipped=False)
+            results.append(result)
+            if result["ok"]:
+                state[job_key(job)] = job_hash
+                print(f"OK   {result['seconds']:7.1f}s {name} -> {job['output']}")
+            else:
+                state.pop(job_key(job), None)
+                print(f"FAIL {result['seconds']:7.1f}s {name}: {result['error']}")
+                for line in result["output"].strip().splitlines()[-15:]:
+                    print(f"    | {line}")
+            if incremental:
+                save_state(state_path, state)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export many rigs to MADL with Blender in background mode.")
+    parser.add_argument("manifest", help="JSON manifest with .blend files and rigs")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable (default: $BLENDER or blender)")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="Blender instances running at once, 0 = one per CPU core")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds one rig may take")
+    parser.add_argument("--incremental", action="store_true", help="Skip rigs whose .blend, exporter and options did not change")
+    parser.add_argument("--state", default=None, help="Incremental state file (default: <manifest>.state.json)")
+    parser.add_argument("--report", default=None, help="Write per-rig results as JSON")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    state_path = args.state or os.path.splitext(args.manifest)[0] + ".state.json"
+
+    start = time.perf_counter()
+    results = batch_export(jobs, args.blender, args.jobs, args.timeout, args.incremental, state_path)
+    failed = [r for r in results if not r["ok"]]
+    skipped = [r for r in results if r["skipped"]]
+    print(f"{len(results) - len(failed) - len(skipped)} exported, {len(skipped)} skipped, {len(failed)} failed in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump([{
+                "blend": r["job"]["blend"],
+                "rig": r["job"]["rig"],
+                "output": r["job"]["output"],
+                "ok": r["ok"],
+                "skipped": r["skipped"],
+                "seconds": round(r["seconds"], 3),
+                "error": r["error"],
+            } for r in results], f, indent=1)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
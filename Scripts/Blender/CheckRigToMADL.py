@@ -0,0 +1,532 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+#
+# Self checks of RigToMADL_v2.py against the reader package (Scripts/Python/madl), on generated data,
+# no .blend needed. The exporter imports bpy, so run them inside Blender:
+#   blender --background --factory-startup --python CheckRigToMADL.py [-- check ...]
+# Without check names every check runs. Exits with 1 if any check fails.
+
+import importlib.util
+import os
+import sys
+import tempfile
+import traceback
+import types
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..", "Python"))
+
+from madl import structs
+from madl.model import mani_st, mphy_st, mphysdata_st, BoneChannels, DynamicVertices
+from madl.pose import Skeleton, Clip, PoseEvaluator, compose
+from madl.reader import MANIFile, MPHYFile
+from madl.skinning import SkinnedMesh
+
+def load_exporter():
+    spec = importlib.util.spec_from_file_location("RigToMADL_v2", os.path.join(HERE, "RigToMADL_v2.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+R = load_exporter()
+
+def random_rotations(rng, shape):
+    quat = rng.normal(size=shape + (4,))
+    quat /= np.linalg.norm(quat, axis=-1, keepdims=True)
+    return np.where(quat[..., :1] < 0, -quat, quat)
+
+def rest_skeleton(rest_positions, rest_rotations, parents=None):
+    # Skeleton from an armature space rest pose, with the bone table written like the exporter's:
+    # head and quaternion relative to the parent's
+    parents = np.full(len(rest_positions), -1) if parents is None else np.asarray(parents)
+    parented = parents >= 0
+    bones = np.zeros(len(rest_positions), dtype=structs.mbone_st)
+    bones["index"] = np.arange(len(bones))
+    bones["name"] = [f"bone{i}".encode() for i in range(len(bones))]
+    bones["parent"] = parents
+    bones["bone_position"] = rest_positions - np.where(parented[:, None], rest_positions[parents], 0)
+    bones["bone_angle"] = rest_rotations - np.where(parented[:, None], rest_rotations[parents], 0)
+    return Skeleton(bones)
+
+def random_animation(rng, frames, bones):
+    # Smooth random motion, every bone moves in every frame
+    rest_positions = rng.uniform(-1, 1, (bones, 3))
+    rest_rotations = random_rotations(rng, (bones,))
+    t = np.linspace(0, 1, frames)[:, None, None]
+    positions = rest_positions[None] + 0.25 * np.sin(2 * np.pi * (t + rng.uniform(0, 1, (1, bones, 3))))
+    axis = rng.normal(size=(1, bones, 3))
+    axis /= np.linalg.norm(axis, axis=-1, keepdims=True)
+    half = 0.5 * np.sin(2 * np.pi * (t + rng.uniform(0, 1, (1, bones, 1))))
+    turn = np.concatenate([np.cos(half), axis * np.sin(half)], axis=-1)
+    rotations = R.quaternion_multiply(turn, rest_rotations[None])
+    return rest_positions, rest_rotations, positions, rotations
+
+def encode_sequence(name, positions, rotations, rest_positions, rest_rotations, encoding, bits=16, interval=8, tolerance=0.0, first_frame=0):
+    # Keyframes reduced and channels dropped within tolerance like the exporter does, 0 keeps every frame
+    frames = list(range(first_frame, first_frame + len(positions)))
+    keys = R.reduce_keyframes(positions, rotations, tolerance, np.arange(0, len(frames), interval))
+    snapshot = keys % interval == 0
+    positions, rotations = positions[keys], rotations[keys]
+    seq = R.manimseq_st()
+    seq.name = R.get_name(name)
+    seq.fps = 24
+    seq.snapshot_interval = interval
+    seq.bone_count = positions.shape[1]
+    if encoding == structs.MANIENCODING.QUANTIZED:
+        encoded = R.quantize_sequence(positions, rotations, rest_positions, rest_rotations, snapshot, bits, tolerance)
+        seq.encoding = encoding
+        seq.bits = bits
+        seq.ranges = encoded
+        seq.frames = R.quantized_frames(frames, keys, snapshot, encoded)
+        error = (encoded["pos_error"].max(), encoded["rot_error"].max())
+    else:
+        delta_pos, delta_rot, bone_flags = R.delta_channels(positions, rotations, rest_positions, rest_rotations, snapshot, tolerance)
+        seq.frames = R.half_frames(frames, keys, snapshot, delta_pos, delta_rot, bone_flags)
+        error = (None, None)
+    seq.numFrames = len(seq.frames)
+    return seq, error
+
+def write_mani(directory, sequences):
+    MANI = mani_st()
+    for i, seq in enumerate(sequences):
+        seq.index = i
+    MANI.num_sequences = len(sequences)
+    base = os.path.join(directory, "check.")
+    R.writeMANI(base, MANI, sequences)
+    return MANIFile(base + "mani", sequences[0].bone_count)
+
+def check_mani_round_trip(directory):
+    # Both encodings decode back to the sampled poses, with more bones than a byte boneIndex can address
+    rng = np.random.default_rng(17)
+    bones = 300
+    rest_positions, rest_rotations, positions, rotations = random_animation(rng, 20, bones)
+    half, _ = encode_sequence("half", positions, rotations, rest_positions, rest_rotations, structs.MANIENCODING.HALF)
+    quantized, (pos_error, rot_error) = encode_sequence("quantized", positions, rotations, rest_positions, rest_rotations, structs.MANIENCODING.QUANTIZED)
+    skeleton = rest_skeleton(rest_positions, rest_rotations)
+    with write_mani(directory, [half, quantized]) as mani:
+        for name, pos_tolerance, rot_tolerance in (("half", 2e-3, 2e-3), ("quantized", pos_error + 1e-5, rot_error + 1e-4)):
+            sequence = mani.sequence(name)
+            masks = mani.bone_masks(sequence)
+            assert masks[:, 256:].any(), f"{name}: no records for bones past 255"
+            for i in range(len(sequence)):
+                frame = sequence.frame(i)
+                index = frame.bones["boneIndex"].astype(np.int64)
+                assert np.array_equal(np.nonzero(masks[i])[0], index), f"{name}: frame {i} boneMask does not match its records"
+            clip = Clip(skeleton, sequence)
+            pos = np.abs(clip.key_positions - positions).max()
+            dot = np.abs((clip.key_rotations * rotations).sum(axis=-1)).clip(0, 1)
+            rot = (2 * np.arccos(dot)).max()
+            assert pos <= pos_tolerance, f"{name}: position error {pos} > {pos_tolerance}"
+            assert rot <= rot_tolerance, f"{name}: rotation error {rot} > {rot_tolerance}"
+
+    try:
+        BoneChannels([1], [1 << 16], [[0, 0, 0]], [[0, 0, 0]])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("bone index 65536 was accepted")
+
+def check_quantized_errors(directory):
+    # The per-bone errors the exporter reports for a quantized sequence are what a reader decodes,
+    # for byte (8 bit) and ushort (12, 16 bit) values, with small channels left out by the tolerance
+    rng = np.random.default_rng(170)
+    bones = 20
+    rest_positions, rest_rotations, positions, rotations = random_animation(rng, 40, bones)
+    positions[:, :5] = rest_positions[:5]
+    sequences = []
+    errors = {}
+    for bits in (8, 12, 16):
+        frames = list(range(len(positions)))
+        keys = np.arange(len(frames))
+        snapshot = keys % 16 == 0
+        encoded = R.quantize_sequence(positions, rotations, rest_positions, rest_rotations, snapshot, bits, 1e-4)
+        seq = R.manimseq_st(name=R.get_name(f"q{bits}"), snapshot_interval=16, encoding=structs.MANIENCODING.QUANTIZED,
+            bits=bits, ranges=encoded, bone_count=bones, frames=R.quantized_frames(frames, keys, snapshot, encoded))
+        seq.numFrames = len(seq.frames)
+        sequences.append(seq)
+        errors[f"q{bits}"] = encoded
+    skeleton = rest_skeleton(rest_positions, rest_rotations)
+    with write_mani(directory, sequences) as mani:
+        for name, encoded in errors.items():
+            clip = Clip(skeleton, mani.sequence(name))
+            pos_error = np.abs(clip.key_positions - positions).max(axis=(0, 2))
+            rot_error = R.quaternion_angle(clip.key_rotations, rotations).max(axis=0)
+            assert np.allclose(pos_error, encoded["pos_error"], atol=1e-6), f"{name}: position errors differ from the reported ones"
+            assert np.allclose(rot_error, encoded["rot_error"], atol=1e-6), f"{name}: rotation errors differ from the reported ones"
+            assert not encoded["pos_mask"][~np.isin(np.arange(40), np.arange(0, 40, 16)), :5].any(), f"{name}: still bones were stored"
+
+def check_pose_interpolation(directory):
+    # Reduced clips sampled at every original frame stay within the keyframe tolerance of the dense poses
+    # (plus what encoding lost on the kept frames); roots and batched PoseEvaluator instances match single clips
+    rng = np.random.default_rng(20)
+    # Starting before frame 0: frame numbers are signed shorts
+    first, frames, bones, tolerance = -10, 60, 12, 0.01
+    rest_positions, rest_rotations, positions, rotations = random_animation(rng, frames, bones)
+    skeleton = rest_skeleton(rest_positions, rest_rotations)
+    sequences = [encode_sequence(name, positions, rotations, rest_positions, rest_rotations, encoding, tolerance=tolerance, first_frame=first)[0]
+        for name, encoding in (("half", structs.MANIENCODING.HALF), ("quantized", structs.MANIENCODING.QUANTIZED))]
+    numbers = np.arange(first, first + frames)
+    with write_mani(directory, sequences) as mani:
+        evaluator = PoseEvaluator(skeleton, mani)
+        for name in ("half", "quantized"):
+            clip = evaluator.clip(name)
+            assert len(clip.key_frames) < frames, f"{clip.name}: no frame was dropped"
+            assert clip.key_frames[0] == first, f"{clip.name}: first frame {clip.key_frames[0]}, expected {first}"
+            kept = (clip.key_frames - first).astype(np.int64)
+            key_pos = np.linalg.norm(clip.key_positions - positions[kept], axis=-1).max()
+            key_rot = R.quaternion_angle(clip.key_rotations, rotations[kept]).max()
+            sampled_positions, sampled_rotations = clip.sample(numbers)
+            pos = np.linalg.norm(sampled_positions - positions, axis=-1).max()
+            rot = R.quaternion_angle(sampled_rotations, rotations).max()
+            assert pos <= tolerance + key_pos + 1e-6, f"{clip.name}: position error {pos} past tolerance {tolerance} + key error {key_pos}"
+            assert rot <= tolerance + key_rot + 1e-5, f"{clip.name}: rotation error {rot} past tolerance {tolerance} + key error {key_rot}"
+            matrices = clip.matrices(numbers)
+            assert np.allclose(matrices, compose(sampled_positions, sampled_rotations)), f"{clip.name}: matrices do not match sample()"
+
+        count = 16
+        names = rng.choice(["half", "quantized"], count).tolist()
+        times = rng.uniform(first, first + frames - 1, count)
+        roots = compose(rng.normal(size=(count, 3)), random_rotations(rng, (count,)))
+        single = np.stack([evaluator.clip(n).matrices(t) for n, t in zip(names, times)])
+        assert np.allclose(evaluator.matrices(names, times), single), "batched instances differ from single clip calls"
+        assert np.allclose(evaluator.matrices(names, times, roots), roots[:, None] @ single), "per instance roots are not applied"
+        assert np.allclose(evaluator.matrices(names, times, roots[0]), roots[0] @ single), "a shared root is not applied"
+        skinning = evaluator.skinning_matrices(names, times, roots)
+        assert np.allclose(skinning, roots[:, None] @ single @ skeleton.inverse_rest_matrices), "skinning matrices differ"
+
+def random_topology(rng, vertices, polygons, materials=3):
+    sizes = rng.integers(3, 6, polygons)
+    loop_start = np.cumsum(sizes) - sizes
+    corners = np.concatenate([rng.choice(vertices, size, replace=False) for size in sizes])
+    return loop_start, sizes.astype(np.int64), corners, rng.integers(-1, materials, polygons)
+
+def random_influences(rng, vertices, bones):
+    # Mostly rigid vertices, some blended and some on a vertex group that is not a bone (-1)
+    numbones = rng.choice([1, 1, 1, 2, 3], vertices)
+    weight = np.zeros((vertices, 3), dtype=np.float32)
+    bone = np.full((vertices, 3), -1, dtype=np.int32)
+    for v, n in enumerate(numbones):
+        weight[v, :n] = 1.0 if n == 1 else rng.dirichlet(np.ones(n))
+        bone[v, :n] = rng.choice(np.arange(-1, bones), n, replace=False) if n > 1 else rng.integers(-1, bones)
+    return numbones, weight, bone
+
+def classify_loop(topology, influences):
+    # Polygon after polygon, what classify_polygons() has to match
+    loop_start, loop_total, corners, material_index = topology
+    numbones, weight, bone = influences
+    static = {}
+    dynamic = {}
+    for p in range(len(loop_start)):
+        verts = corners[loop_start[p]:loop_start[p] + loop_total[p]]
+        first = int(bone[verts[0], 0])
+        rigid = all(numbones[v] == 1 and weight[v, 0] == 1 and bone[v, 0] == first for v in verts) and first >= 0
+        (static if rigid else dynamic).setdefault((int(material_index[p]), first), []).append(p)
+    return static, dynamic
+
+def check_classify_polygons(directory):
+    # Static only when every corner is on the same single bone: quad 0 spans bones 0 and 1, polygon 2 has a blended corner
+    topology = (np.array([0, 4, 7, 10, 13]), np.array([4, 3, 3, 3, 4]),
+        np.array([0, 1, 2, 3, 4, 5, 6, 0, 1, 7, 6, 5, 4, 2, 3, 4, 5]), np.array([0, 0, 0, 1, 0]))
+    influences = (np.array([1, 1, 1, 1, 1, 1, 1, 2]),
+        np.array([[1, 0], [1, 0], [1, 0], [1, 0], [1, 0], [1, 0], [1, 0], [0.5, 0.5]], dtype=np.float32),
+        np.array([[0, -1], [0, -1], [1, -1], [1, -1], [2, -1], [2, -1], [2, -1], [0, 1]], dtype=np.int32))
+    static, dynamic = R.classify_polygons(topology, influences)
+    assert [(m, b, list(p)) for m, b, p in static] == [(0, 2, [1]), (1, 2, [3])], static
+    assert [(m, b, list(p)) for m, b, p in dynamic] == [(0, 0, [0, 2]), (0, 1, [4])], dynamic
+
+    rng = np.random.default_rng(4)
+    for _ in range(20):
+        topology = random_topology(rng, 40, 200)
+        influences = random_influences(rng, 40, 4)
+        expected_static, expected_dynamic = classify_loop(topology, influences)
+        static, dynamic = R.classify_polygons(topology, influences)
+        assert {(m, b): list(p) for m, b, p in static} == expected_static
+        assert {(m, b): list(p) for m, b, p in dynamic} == expected_dynamic
+
+def check_index_polygons(directory):
+    # Every triangle corner gets its own loop's vertex and UV, and vertices are only split on UV seams
+    rng = np.random.default_rng(25)
+    for _ in range(10):
+        topology = random_topology(rng, 60, 300)
+        loop_start, loop_total, corners, _ = topology
+        vertex_uvs = rng.uniform(0, 1, (60, 2)).astype(np.float32)
+        polys = np.sort(rng.choice(len(loop_start), 200, replace=False))
+
+        pool, pool_uvs, indices = R.index_polygons(topology, polys, vertex_uvs[corners])
+        assert np.array_equal(pool, np.unique(corners[R.polygon_loops(loop_start, loop_total, polys)[0]])), "split without a seam"
+
+        loop_uvs = vertex_uvs[corners]
+        seam = rng.uniform(size=len(loop_uvs)) < 0.1
+        loop_uvs[seam] += 0.5
+        # -0.0 and 0.0 are the same UV
+        loop_uvs[corners == 7] = (0.0, 0.25)
+        loop_uvs[(corners == 7) & (np.arange(len(corners)) % 2 == 0)] = (-0.0, 0.25)
+        pool, pool_uvs, indices = R.index_polygons(topology, polys, loop_uvs)
+
+        triangles = []
+        for p in polys:
+            start, size = loop_start[p], loop_total[p]
+            for k in range(1, size - 1):
+                triangles += [start, start + k, start + k + 1]
+        triangles = np.array(triangles)
+        assert np.array_equal(pool[indices], corners[triangles]), "triangle corner with another loop's vertex"
+        assert np.array_equal(pool_uvs[indices], loop_uvs[triangles] + np.float32(0.0)), "triangle corner with another loop's UV"
+        used = np.concatenate([np.arange(loop_start[p], loop_start[p] + loop_total[p]) for p in polys])
+        distinct = {(int(v), float(u), float(w)) for v, (u, w) in zip(corners[used], loop_uvs[used] + np.float32(0.0))}
+        assert len(pool) == len(distinct), f"{len(pool)} pool vertices for {len(distinct)} distinct (vertex, uv)"
+
+def check_dynamic_vertices(directory):
+    # mdynvert_st records written by DynamicVertices read back the same, struct_size and offsets included
+    rng = np.random.default_rng(22)
+    count = 100
+    numbones = rng.integers(0, 5, count)
+    width = int(numbones.max())
+    slots = np.arange(width) < numbones[:, None]
+    vertices = DynamicVertices(numbones, np.where(slots, rng.uniform(size=(count, width)), 0),
+        np.where(slots, rng.integers(0, 300, (count, width)), -1), rng.normal(size=(count, 3)),
+        rng.normal(size=(count, 3)), rng.uniform(size=(count, 2)))
+    data = vertices.tobytes()
+    assert len(data) == vertices.nbytes
+    offsets = np.cumsum(vertices.sizes) - vertices.sizes
+    struct_size = np.frombuffer(data, dtype=np.uint8)[offsets[:, None] + np.arange(4)].copy().view("<i4").reshape(-1)
+    assert np.array_equal(struct_size + 4, vertices.sizes), "struct_size does not match the record sizes"
+    decoded = DynamicVertices.from_buffer(data, offsets, vertices.numbones)
+    for name in DynamicVertices.__slots__:
+        assert np.array_equal(decoded[name], vertices[name]), f"{name} differs after a round trip"
+
+def check_skinning(directory):
+    # SkinnedMesh against the blend written out by hand: rest pose, one translated bone, batched poses
+    rng = np.random.default_rng(21)
+    count, bones = 200, 6
+    numbones, weight, bone = random_influences(rng, count, bones)
+    normals = rng.normal(size=(count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    vertices = DynamicVertices(numbones, weight, bone, rng.normal(size=(count, 3)), normals, rng.uniform(size=(count, 2)))
+    mesh = SkinnedMesh(vertices)
+    positions = vertices["vert_position"].astype(np.float64)
+    identity = np.broadcast_to(np.eye(4), (bones, 4, 4))
+    skinned, skinned_normals = mesh.skin(identity)
+    assert np.allclose(skinned, positions, atol=1e-6), "identity matrices moved vertices"
+    assert np.allclose(skinned_normals, vertices["vert_normal"], atol=1e-6), "identity matrices turned normals"
+
+    valid = np.where((bone >= 0) & (weight > 0), weight, 0)
+    total = valid.sum(axis=1, keepdims=True)
+    share = np.where(total > 0, valid / np.where(total > 0, total, 1), 0)
+    offset = np.array([0.5, -1.0, 2.0])
+    for moved in range(bones):
+        matrices = np.array(identity)
+        matrices[moved, :3, 3] = offset
+        skinned, _ = mesh.skin(matrices, normals=False)
+        expected = positions + (share * (bone == moved)).sum(axis=1, keepdims=True) * offset
+        assert np.allclose(skinned, expected, atol=1e-5), f"translating bone {moved} does not move vertices by their weight"
+
+    poses = np.zeros((5, bones, 4, 4))
+    poses[..., :3, :3] = R.quaternion_to_matrix(random_rotations(rng, (5, bones)))
+    poses[..., :3, 3] = rng.normal(size=(5, bones, 3))
+    poses[..., 3, 3] = 1
+    batch_positions, batch_normals = mesh.skin(poses)
+    for p, pose in enumerate(poses):
+        single_positions, single_normals = mesh.skin(pose)
+        assert np.allclose(batch_positions[p], single_positions, atol=1e-5), f"batched pose {p} positions differ"
+        assert np.allclose(batch_normals[p], single_normals, atol=1e-5), f"batched pose {p} normals differ"
+
+    empty = SkinnedMesh({"vert_position": np.zeros((0, 3)), "vert_normal": np.zeros((0, 3)), "bone": np.zeros(0), "weight": np.zeros(0)})
+    skinned, skinned_normals = empty.skin(identity)
+    assert skinned.shape == (0, 3) and skinned_normals.shape == (0, 3), "an empty mesh does not skin to (0, 3)"
+    assert empty.skin(poses)[0].shape == (5, 0, 3), "an empty mesh does not skin batched poses to (P, 0, 3)"
+
+def check_vertex_spaces(directory):
+    # Dynamic vertices in armature space and static vertices in rest bone space land on the same posed points,
+    # with the mesh object and the rig transformed differently (non-uniform scale on the mesh)
+    rng = np.random.default_rng(3)
+    bones = 8
+    parents = np.array([-1] + [int(rng.integers(0, i)) for i in range(1, bones)])
+    rest_positions = rng.uniform(-1, 1, (bones, 3))
+    rest_rotations = random_rotations(rng, (bones,))
+    skeleton = rest_skeleton(rest_positions, rest_rotations, parents)
+    rig = types.SimpleNamespace(matrix_world=compose(rng.normal(size=3), random_rotations(rng, ())) @ np.diag([2.0, 2.0, 2.0, 1.0]))
+    obj = types.SimpleNamespace(matrix_world=compose(rng.normal(size=3), random_rotations(rng, ())) @ np.diag([0.5, 1.5, 3.0, 1.0]))
+    count = 50
+    co = rng.normal(size=(count, 3))
+    normals = rng.normal(size=(count, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+
+    armature_pos, armature_normal = R.get_vertices_armature_space(obj, rig, (co, normals))
+    assert np.allclose(R.transform_points(rig.matrix_world, armature_pos), R.transform_points(obj.matrix_world, co)), "armature space positions are off in world space"
+    world_normal = normals @ np.linalg.inv(obj.matrix_world[:3, :3])
+    world_normal /= np.linalg.norm(world_normal, axis=1, keepdims=True)
+    back = armature_normal @ np.linalg.inv(rig.matrix_world[:3, :3])
+    assert np.allclose(np.linalg.norm(armature_normal, axis=1), 1), "armature space normals are not unit length"
+    assert np.allclose(back / np.linalg.norm(back, axis=1, keepdims=True), world_normal), "armature space normals point elsewhere in world space"
+
+    pose = compose(rng.uniform(-1, 1, (bones, 3)), random_rotations(rng, (bones,)))
+    inverses = {}
+    for bone in range(bones):
+        rest = types.SimpleNamespace(name=f"bone{bone}", matrix_local=skeleton.rest_matrices[bone])
+        pos, normal = R.to_bone_space(R.get_bone_inverse(rest, inverses), armature_pos, armature_normal)
+        assert np.allclose(R.transform_points(skeleton.rest_matrices[bone], pos), armature_pos), f"bone {bone}: static vertices do not rest where the mesh does"
+        assert np.allclose(normal @ skeleton.rest_matrices[bone][:3, :3].T, armature_normal), f"bone {bone}: static normals do not rest where the mesh's do"
+        rigid = DynamicVertices(np.ones(count), np.ones((count, 1)), np.full((count, 1), bone), armature_pos, armature_normal, np.zeros((count, 2)))
+        skinned, _ = SkinnedMesh(rigid).skin(pose @ skeleton.inverse_rest_matrices)
+        assert np.allclose(skinned, R.transform_points(pose[bone], pos), atol=1e-4), f"bone {bone}: posed static and dynamic vertices differ"
+
+def check_vertex_groups(directory):
+    # vertex_influences() and vertex_group_index() read the same vertex_groups() memberships
+    rng = np.random.default_rng(11)
+    count, group_count = 50, 6
+    verts = np.repeat(np.arange(count), rng.integers(0, 4, count))
+    groups = np.concatenate([rng.choice(group_count, n, replace=False) for n in np.bincount(verts, minlength=count)])
+    weights = rng.uniform(0, 1, len(verts)).astype(np.float32)
+    group_bones = np.array([3, -1, 0, 2, 1, 4])
+
+    numbones, weight, bone = R.vertex_influences((verts, groups, weights), count, group_bones)
+    group_verts, group_starts = R.vertex_group_index((verts, groups, weights), group_count)
+    for v in range(count):
+        rows = np.nonzero(verts == v)[0]
+        assert numbones[v] == len(rows)
+        assert np.array_equal(weight[v, :len(rows)], weights[rows]) and not weight[v, len(rows):].any()
+        assert np.array_equal(bone[v, :len(rows)], group_bones[groups[rows]]) and (bone[v, len(rows):] == -1).all()
+    for g in range(group_count):
+        assert np.array_equal(group_verts[group_starts[g]:group_starts[g + 1]], verts[groups == g])
+
+def check_physics_refit(directory):
+    # Physics shapes are stored in rest bone space: refit() with the rest pose gives back the stored BVH,
+    # and refit() with any pose bounds the posed hull vertices
+    rng = np.random.default_rng(13)
+    bones = 12
+    parents = np.array([-1] + [int(rng.integers(0, i)) for i in range(1, bones)])
+    rest_positions = rng.uniform(-1, 1, (bones, 3))
+    rest_rotations = random_rotations(rng, (bones,))
+    skeleton = rest_skeleton(rest_positions, rest_rotations, parents)
+    rest_matrices = compose(rest_positions, rest_rotations)
+
+    phys_table = []
+    for i, bone in enumerate(rng.choice(bones, 9, replace=False)):
+        points = rest_positions[bone] + rng.normal(scale=(0.3, 0.1, 0.05), size=(40, 3))
+        pos, faces, bounds, rest_bounds = R.physics_shape(points, rest_matrices[bone], True, 0.001, 16)
+        phy = mphysdata_st(index=i + 1, name=R.get_name(f"phy_{i}"), parented=1, boneIndex=int(bone), vertices=pos, vertices_count=len(pos), faces=faces)
+        phy.struct_size = 69 + len(pos) * 12 + 4 + len(faces) * 6
+        phy.mins, phy.maxs, phy.center, phy.radius = bounds
+        phy.rest_mins, phy.rest_maxs = rest_bounds
+        phys_table.append(phy)
+    MPHY = mphy_st(phy_count=len(phys_table))
+    MPHY.bvh = R.build_bvh(np.concatenate([phy.rest_mins for phy in phys_table]), np.concatenate([phy.rest_maxs for phy in phys_table]))
+    R.writeMPHY(os.path.join(directory, "check."), MPHY, phys_table)
+
+    with MPHYFile(os.path.join(directory, "check.mphy")) as mphy:
+        mins, maxs = mphy.refit(skeleton.rest_matrices)
+        assert np.allclose(mins, mphy.bvh["mins"], atol=1e-4) and np.allclose(maxs, mphy.bvh["maxs"], atol=1e-4), "rest pose refit does not match the stored BVH"
+
+        pose = compose(rng.uniform(-1, 1, (bones, 3)), random_rotations(rng, (bones,)))
+        mins, maxs = mphy.refit(pose)
+        leaves = {int(phy): node for node, phy in enumerate(mphy.bvh["phy"]) if phy >= 0}
+        for i, mesh in enumerate(mphy.meshes):
+            posed = R.transform_points(pose[mesh.boneIndex], mesh.vertices)
+            assert (posed >= mins[leaves[i]] - 1e-4).all() and (posed <= maxs[leaves[i]] + 1e-4).all(), f"posed hull {i} leaves its refit box"
+            assert (posed >= mins[0] - 1e-4).all() and (posed <= maxs[0] + 1e-4).all(), f"posed hull {i} leaves the refit root box"
+
+def check_convex_hull(directory):
+    # max_vertices holds for solid and for flat input, and every hull is closed
+    rng = np.random.default_rng(12)
+    tilt = R.quaternion_to_matrix(random_rotations(rng, (1,)))[0]
+    disc = rng.uniform(-1, 1, (500, 3)) * (1, 1, 0) @ tilt.T + 5
+    cases = (("solid", rng.normal(size=(500, 3)), 16), ("flat", disc, 16), ("flat uncapped", disc, 0))
+    for name, points, max_vertices in cases:
+        vertices, faces = R.convex_hull(points, max_vertices)
+        assert len(faces) > 0, f"{name}: no triangles"
+        assert max_vertices == 0 or len(vertices) <= max_vertices, f"{name}: {len(vertices)} vertices > {max_vertices}"
+        edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+        forward = {tuple(edge) for edge in edges}
+        assert all((b, a) in forward for a, b in forward), f"{name}: hull is not closed"
+    vertices, faces = R.convex_hull(disc, 0)
+    normals, offsets = R.face_planes(disc[vertices], faces)
+    assert (disc @ normals.T - offsets <= 1e-6).all(), "flat: points outside the uncapped hull"
+
+    line = np.linspace(0, 1, 50)[:, None] * (1, 2, 3)
+    vertices, faces = R.convex_hull(line, 16)
+    assert sorted(vertices) == [0, 49] and len(faces) == 0, "line: not its two ends"
+    vertices, faces = R.convex_hull(np.ones((10, 3)), 16)
+    assert len(vertices) == 1 and len(faces) == 0, "point: not a single vertex"
+
+# Stand-in for VTFCMD: the input file's first bytes pick what it does
+FAKE_VTFCMD = """import os, sys, time
+path = sys.argv[sys.argv.index("-file") + 1]
+with open(path, "rb") as f:
+    data = f.read()
+if data.startswith(b"slow"):
+    time.sleep(5)
+if data.startswith(b"fail"):
+    print("fake vtfcmd failed")
+    sys.exit(3)
+if not data.startswith(b"noout"):
+    with open(os.path.splitext(path)[0] + ".vtf", "wb") as f:
+        f.write(b"VTF" + data)
+"""
+
+def fake_vtfcmd(directory):
+    script = os.path.join(directory, "fake_vtfcmd.py")
+    with open(script, "w") as f:
+        f.write(FAKE_VTFCMD)
+    if os.name == "nt":
+        path = os.path.join(directory, "fake_vtfcmd.cmd")
+        with open(path, "w") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(directory, "fake_vtfcmd")
+        with open(path, "w") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_VTFCMD}")
+        os.chmod(path, 0o755)
+    return path
+
+def expect_vtf_error(future, text):
+    try:
+        future.result()
+    except R.VtfConversionError as e:
+        assert text in str(e), f"expected {text!r}, got {e}"
+    else:
+        raise AssertionError(f"no VtfConversionError, expected {text!r}")
+
+def check_vtf_scheduler(directory):
+    # Success (then cached), non-zero exit, no output file, timeout and a missing executable
+    vtfcmd = fake_vtfcmd(directory)
+    with R.TextureEncoder(os.path.join(directory, "cache")) as encoder, R.VtfScheduler(vtfcmd, 4, 1) as scheduler:
+        converted = R.schedule_vtf(scheduler, encoder, b"texture")
+        failed = R.schedule_vtf(scheduler, encoder, b"fail")
+        no_output = R.schedule_vtf(scheduler, encoder, b"noout")
+        slow = R.schedule_vtf(scheduler, encoder, b"slow")
+        assert R.schedule_vtf(scheduler, encoder, None).result() is None
+        assert converted.result() == b"VTFtexture", converted.result()
+        expect_vtf_error(failed, "exited with code 3")
+        expect_vtf_error(no_output, "did not produce")
+        expect_vtf_error(slow, "timed out")
+        cached = R.schedule_vtf(scheduler, encoder, b"texture")
+        assert cached.done() and cached.result() == b"VTFtexture", "converted texture was not cached"
+
+    with R.TextureEncoder() as encoder, R.VtfScheduler(os.path.join(directory, "no_vtfcmd"), 1) as scheduler:
+        expect_vtf_error(R.schedule_vtf(scheduler, encoder, b"texture"), "Could not run VTFCMD")
+
+CHECKS = {name[len("check_"):]: check for name, check in globals().items() if name.startswith("check_")}
+
+def main(argv):
+    names = argv or list(CHECKS)
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        print(f"ERROR: unknown checks {', '.join(unknown)}, there are {', '.join(CHECKS)}")
+        return 1
+    failed = 0
+    for name in names:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                CHECKS[name](directory)
+            except Exception:
+                failed += 1
+                print(f"FAIL {name}")
+                traceback.print_exc()
+            else:
+                print(f"ok   {name}")
+    print(f"{len(names) - failed}/{len(names)} checks passed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []))
@@ -5,37 +5,69 @@ import mathutils
 import random
 import tempfile
 from collections import defaultdict
-import io
+import hashlib
+import os
 import struct
+import zlib
+import shlex
 import subprocess
-import threading
+import sys
+import concurrent.futures
+import numpy as np
 
-def get_vertex_position_and_normal(obj, bone, vertex_index):
-    armature = obj.find_armature()
-    if not armature:
-        raise ValueError("The object does not have an armature.")
+# Records, column stores and binary layouts are shared with the standalone reader in Scripts/Python/madl
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Python"))
+from madl.quat import (quaternion_multiply, quaternion_inverse, quaternion_angle, quaternion_to_matrix, matrix_to_quaternion,
+    quaternion_slerp, quaternion_to_euler, euler_to_quaternion, smallest_three, from_smallest_three)
+from madl.structs import MBONEFLAGS, MFRAMEFLAGS, MANIENCODING, mphybound_st, mbvhnode_st, mchanrange_st
+from madl.model import (madl_st, mbone_st, mstmesh_st, mdynmesh_st, StaticVertices, DynamicVertices, mtex_st, mtexdata_st,
+    mphy_st, mphysdata_st, mani_st, manimseq_st, manimdata_st, BoneChannels)
 
-    if vertex_index >= len(obj.data.vertices):
-        raise IndexError("Invalid vertex index.")
-    
-    vertex = obj.data.vertices[vertex_index]
+def get_vertex_arrays(obj):
+    # Object space (vertices, 3) positions and normals
+    vertices = obj.data.vertices
+    co = np.empty(len(vertices) * 3, dtype=np.float32)
+    normal = np.empty(len(vertices) * 3, dtype=np.float32)
+    vertices.foreach_get("co", co)
+    vertices.foreach_get("normal", normal)
+    return co.reshape(-1, 3), normal.reshape(-1, 3)
 
-    world_pos = obj.matrix_world @ vertex.co
+def get_vertices_armature_space(obj, rig, local=None):
+    # Positions and normals in the rig's armature space, inv(rig.matrix_world) @ obj.matrix_world: the space
+    # Bone.head_local/matrix_local and the reader's Skeleton and PoseEvaluator matrices are in.
+    # Normals go through the inverse transpose and are renormalized, so scaled objects keep unit normals.
+    co, normal = local if local != None else get_vertex_arrays(obj)
+    matrix = np.linalg.inv(np.array(rig.matrix_world, dtype=np.float64)) @ np.array(obj.matrix_world, dtype=np.float64)
+    position = transform_points(matrix, co)
+    normal = normal @ np.linalg.inv(matrix[:3, :3])
+    length = np.linalg.norm(normal, axis=1, keepdims=True)
+    return position, normal / np.where(length > 0, length, 1.0)
 
-    world_normal = obj.matrix_world.to_3x3() @ vertex.normal
+def get_bone_inverse(bone, cache):
+    # Inverse rest matrix (Bone.matrix_local): armature space -> bone space, undone by Skeleton.rest_matrices
+    if bone.name not in cache:
+        cache[bone.name] = np.linalg.inv(np.array(bone.matrix_local, dtype=np.float64))
+    return cache[bone.name]
 
-    bone_matrix = bone.matrix
-    local_pos = bone_matrix.inverted() @ world_pos
-    local_normal = bone_matrix.inverted().to_3x3() @ world_normal
+def to_bone_space(bone_inverse, armature_pos, armature_normal):
+    local_pos = armature_pos @ bone_inverse[:3, :3].T
+    if bone_inverse.shape[0] == 4:
+        local_pos += bone_inverse[:3, 3]
+    local_normal = armature_normal @ bone_inverse[:3, :3].T
 
     return local_pos, local_normal
 
+def transform_points(matrix, points):
+    # (N,3) points moved by a 4x4 matrix
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return np.asarray(points, dtype=np.float64).reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
 def get_name(name):
     return list(name.encode("utf-8").ljust(32,b"\x00").decode("utf-8"))
     
-def get_mat_base_texture(material,tex_type):
+def get_mat_image(material,input_name):
     if not material.node_tree:
-        return [None,None]
+        return None
     
     material_output_node = None
     for node in material.node_tree.nodes:
@@ -44,7 +76,7 @@ def get_mat_base_texture(material,tex_type):
             break
 
     if not material_output_node:
-        return [None,None]
+        return None
         
     bsdf_node = None
     for node in material.node_tree.nodes:
@@ -57,102 +89,243 @@ def get_mat_base_texture(material,tex_type):
             break
 
     if not bsdf_node:
-        return [None,None]
+        return None
 
-    base_color_input = bsdf_node.inputs.get("Base Color")
-    if base_color_input and base_color_input.is_linked:
-        image_texture_node = base_color_input.links[0].from_node
+    image_input = bsdf_node.inputs.get(input_name)
+    if image_input and image_input.is_linked:
+        image_texture_node = image_input.links[0].from_node
         if image_texture_node.type == 'TEX_IMAGE':
-            image = image_texture_node.image
-            
-            temp_file = tempfile.gettempdir() + "/base_texture_"+str(random.randint(0,0xFFFF))+"."+(tex_type.lower() == "vtf" and "png" or tex_type.lower())
-            orig_image = image.pixels
-            image.filepath_raw = temp_file
-            image.file_format = tex_type == "VTF" and "PNG" or tex_type
-            image.save()
-            
-            #image.pixels = orig_image
-            #image.update()
+            return image_texture_node.image
 
-            with open(temp_file, "rb") as f:
-                base64_str = f.read().decode("latin-1")
-            return [base64_str,temp_file]
+    return None
 
-    return [None,None]
+def get_mat_base_texture(material,tex_type,encoder):
+    image = get_mat_image(material,"Base Color")
+    return image and encoder.encode(image,tex_type)
 
-def get_mat_emission(material,tex_type):
-    if not material.node_tree:
-        return [None,None]
-    
-    material_output_node = None
-    for node in material.node_tree.nodes:
-        if node.type == 'OUTPUT_MATERIAL':
-            material_output_node = node
-            break
+def get_mat_emission(material,tex_type,encoder):
+    image = get_mat_image(material,"Emission")
+    return image and encoder.encode(image,tex_type)
 
-    if not material_output_node:
-        return [None,None]
-        
-    bsdf_node = None
-    for node in material.node_tree.nodes:
-        for input_socket in node.inputs:
-            if input_socket.is_linked:
-                if node.type == 'BSDF_PRINCIPLED':
-                    bsdf_node = node
-                    break
-        if bsdf_node:
-            break
+def get_image_pixels(image):
+    # RGBA bytes, top row first, as image files store them
+    width, height = image.size
+    channels = image.channels
+    pixels = np.empty(width * height * channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, channels)[::-1]
 
-    if not bsdf_node:
-        return [None,None]
+    if image.is_float:
+        # Float buffers are linear, byte images are already display encoded
+        rgb = np.clip(pixels[..., :3], 0.0, 1.0)
+        pixels = pixels.copy()
+        pixels[..., :3] = np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1 / 2.4) - 0.055)
 
-    base_color_input = bsdf_node.inputs.get("Emission")
-    if base_color_input and base_color_input.is_linked:
-        image_texture_node = base_color_input.links[0].from_node
-        if image_texture_node.type == 'TEX_IMAGE':
-            image = image_texture_node.image
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    if channels >= 3:
+        rgba[..., :3] = np.rint(np.clip(pixels[..., :3], 0.0, 1.0) * 255)
+    else:
+        rgba[..., :3] = np.rint(np.clip(pixels[..., :1], 0.0, 1.0) * 255)
+    rgba[..., 3] = 255 if channels in (1, 3) else np.rint(np.clip(pixels[..., -1], 0.0, 1.0) * 255)
+    return rgba
+
+def png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def encode_png(rgba):
+    height, width = rgba.shape[:2]
+    rows = np.zeros((height, 1 + width * 4), dtype=np.uint8) # filter byte 0 (None) per row
+    rows[:, 1:] = rgba.reshape(height, -1)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+        png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)),
+        png_chunk(b"IEND", b""),
+    ))
+
+VTFCMD_FLAGS = "-format \"dxt1_onebitalpha\" -alphaformat \"dxt1_onebitalpha\" -nothumbnail -noreflectivity -nomipmaps"
+
+def default_texture_cache_path():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "madl", "textures")
+
+class TextureCache:
+    """
+    Encoded texture payloads on disk, content addressed: the key is built from the pixel
+    hash plus everything that changes the encoded bytes (format, VTFCMD flags).
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self.file(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        path = self.file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a unique name and renamed, so parallel exports never see half a file
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_file, path)
+        except OSError:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+class TextureEncoder:
+    """
+    Encodes images for MTEX without touching the image datablock.
+    PNG (also the VTFCMD input) is encoded in memory, JPEG has no in-memory
+    encoder in Blender and goes through a private temp directory.
+    Results are cached by pixel content, in memory for this export and in
+    TextureCache (if cache_path is given) across exports.
+    """
+    def __init__(self, cache_path=None):
+        self.cache = {}
+        self.disk_cache = cache_path and TextureCache(cache_path) or None
+        self.workdir = tempfile.TemporaryDirectory(prefix="madl_")
+        self.file_count = 0
+
+    def lookup(self, key):
+        data = self.cache.get(key)
+        if data == None and self.disk_cache != None:
+            data = self.disk_cache.get(key)
+            if data != None:
+                self.cache[key] = data
+        return data
+
+    def store(self, key, data):
+        self.cache[key] = data
+        if self.disk_cache != None:
+            self.disk_cache.put(key, data)
+
+    def vtf_key(self, png_data):
+        # PNG bytes are a pure function of the pixels, so they address the VTF as well
+        flags = hashlib.sha1(VTFCMD_FLAGS.encode()).hexdigest()[:8]
+        return f"{hashlib.sha1(png_data).hexdigest()}_{flags}.vtf"
 
-            temp_file = tempfile.gettempdir() + "/emission_texture_"+str(random.randint(0,0xFFFF))+"."+(tex_type.lower() == "vtf" and "png" or tex_type.lower())
-            orig_image = image.pixels
+    def temp_path(self, ext):
+        self.file_count = self.file_count + 1
+        return os.path.join(self.workdir.name, f"texture_{self.file_count}.{ext}")
+
+    def encode(self, image, tex_type):
+        if len(image.pixels) == 0:
+            return None
+        rgba = get_image_pixels(image)
+        file_format = tex_type == "VTF" and "PNG" or tex_type
+        key = f"{hashlib.sha1(rgba).hexdigest()}_{rgba.shape[1]}x{rgba.shape[0]}.{file_format.lower()}"
+        data = self.lookup(key)
+        if data == None:
+            if file_format == "PNG":
+                data = encode_png(rgba)
+            else:
+                data = self.save_with_blender(image, file_format)
+            self.store(key, data)
+        return data
+
+    def save_with_blender(self, image, file_format):
+        temp_file = self.temp_path(file_format.lower())
+        orig_filepath, orig_format = image.filepath_raw, image.file_format
+        try:
             image.filepath_raw = temp_file
-            image.file_format = tex_type == "VTF" and "PNG" or tex_type
+            image.file_format = file_format
             image.save()
-            
-            #image.pixels = orig_image
-            #image.update()
-                        
-            with open(temp_file, "rb") as f:
-                base64_str = f.read().decode("latin-1")
-            return [base64_str,temp_file]
-
-    return [None,None]
-
-def textureToVtf(idx,mat,base_filepath, emission_filepath, vtfcmd_path,vtf_results):
-    print("VTF Handling: "+mat.name)
-    base_tex_proc = subprocess.run(f"{vtfcmd_path} -file \"{base_filepath}\" -format \"dxt1_onebitalpha\" -alphaformat \"dxt1_onebitalpha\" -nothumbnail -noreflectivity -nomipmaps", stdout=subprocess.PIPE)
-    print(base_tex_proc.stdout)
-    
-    if emission_filepath != None:
-        emission_proc = subprocess.run(f"{vtfcmd_path} -file \"{emission_filepath}\" -format \"dxt1_onebitalpha\" -alphaformat \"dxt1_onebitalpha\" -nothumbnail -noreflectivity -nomipmaps", stdout=subprocess.PIPE)
-        print(emission_proc.stdout)
-    
-    if base_tex_proc.returncode == 0:
-        new_bt_filepath = base_filepath.split('.')[0] + ".vtf"
-        with open(new_bt_filepath,"rb") as f:
-            base_tex_data = f.read().decode("latin-1")
-    else:
-        base_tex_data = None
-    
-    emmision_data = None
-    if emission_filepath != None:
-        if emission_proc.returncode == 0:
-            new_emission_filepath = emission_filepath.split('.')[0] + ".vtf"
-            with open(new_emission_filepath,"rb") as f:
-                emmision_data = f.read().decode("latin-1")
-        else:
-            emmision_data = None
-            
-    vtf_results[idx] = [mat,base_tex_data,emmision_data]
+        finally:
+            image.filepath_raw = orig_filepath
+            image.file_format = orig_format
+        with open(temp_file, "rb") as f:
+            data = f.read()
+        os.remove(temp_file)
+        return data
+
+    def to_file(self, data, ext):
+        temp_file = self.temp_path(ext)
+        with open(temp_file, "wb") as f:
+            f.write(data)
+        return temp_file
+
+    def cleanup(self):
+        self.cache.clear()
+        self.workdir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+class VtfConversionError(RuntimeError):
+    pass
+
+def run_vtfcmd(vtfcmd_path, input_path, timeout=None):
+    try:
+        proc = subprocess.run([vtfcmd_path, "-file", input_path, *shlex.split(VTFCMD_FLAGS)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise VtfConversionError(f"VTFCMD timed out after {timeout}s on {os.path.basename(input_path)}")
+    except OSError as e:
+        raise VtfConversionError(f"Could not run VTFCMD ({vtfcmd_path}): {e}")
+
+    output = proc.stdout.decode("utf-8", "replace").strip()
+    if proc.returncode != 0:
+        raise VtfConversionError(f"VTFCMD exited with code {proc.returncode} on {os.path.basename(input_path)}: {output}")
+
+    vtf_path = os.path.splitext(input_path)[0] + ".vtf"
+    try:
+        with open(vtf_path, "rb") as f:
+            return f.read()
+    except OSError:
+        raise VtfConversionError(f"VTFCMD did not produce {os.path.basename(vtf_path)}: {output}")
+
+class VtfScheduler:
+    """
+    Runs VTFCMD conversions as independent jobs, at most max_workers processes at once
+    (0 = one per CPU core). Every job is a Future, failures are raised from result().
+    """
+    def __init__(self, vtfcmd_path, max_workers=0, timeout=None):
+        self.vtfcmd_path = vtfcmd_path
+        self.timeout = timeout or None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers or os.cpu_count() or 1, thread_name_prefix="vtfcmd")
+
+    def submit(self, input_path, on_result=None):
+        def job():
+            data = run_vtfcmd(self.vtfcmd_path, input_path, self.timeout)
+            if on_result != None:
+                on_result(data)
+            return data
+        return self.executor.submit(job)
+
+    def shutdown(self, cancel=False):
+        self.executor.shutdown(wait=True, cancel_futures=cancel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.shutdown(cancel=exc_type != None)
+
+def schedule_vtf(scheduler, encoder, png_data):
+    # Future with the VTF bytes: finished right away if there is no image or it is cached
+    if png_data == None:
+        future = concurrent.futures.Future()
+        future.set_result(None)
+        return future
+    key = encoder.vtf_key(png_data)
+    data = encoder.lookup(key)
+    if data != None:
+        future = concurrent.futures.Future()
+        future.set_result(data)
+        return future
+    return scheduler.submit(encoder.to_file(png_data,"png"), lambda vtf: encoder.store(key,vtf))
 
 def get_objects_parented_to_rig(rig):
     parented_objects = []
@@ -165,27 +338,640 @@ def get_objects_parented_to_rig(rig):
 
     return parented_objects
 
-def separate_polygons_by_material(obj):
-    polys_by_material = defaultdict(list)
+def mesh_topology(obj):
+    # Polygon -> loop -> vertex arrays read with foreach_get, instead of walking polygon objects
+    polygons = obj.data.polygons
+    loop_start = np.empty(len(polygons), dtype=np.int32)
+    loop_total = np.empty(len(polygons), dtype=np.int32)
+    material_index = np.empty(len(polygons), dtype=np.int32)
+    corners = np.empty(len(obj.data.loops), dtype=np.int32)
+    polygons.foreach_get("loop_start", loop_start)
+    polygons.foreach_get("loop_total", loop_total)
+    polygons.foreach_get("material_index", material_index)
+    obj.data.loops.foreach_get("vertex_index", corners)
+    # Indices past the material list all mean "no material"
+    material_index[material_index >= len(obj.data.materials)] = -1
+    return loop_start.astype(np.int64), loop_total.astype(np.int64), corners.astype(np.int64), material_index.astype(np.int64)
 
-    for poly in obj.data.polygons:
-        material = obj.data.materials[poly.material_index] if poly.material_index < len(obj.data.materials) else None
-        polys_by_material[material].append(poly)
+def polygon_loops(loop_start, loop_total, polys):
+    # Loop indices of polys, polygon after polygon, and the size of every polygon
+    sizes = loop_total[polys]
+    return np.repeat(loop_start[polys] - (np.cumsum(sizes) - sizes), sizes) + np.arange(int(sizes.sum())), sizes
 
-    return polys_by_material
+def vertex_groups(obj):
+    # Vertex, group and weight of every vertex group membership, vertex after vertex. The one pass over
+    # v.groups per object, Blender has no foreach_get for vertex weights.
+    verts = []
+    groups = []
+    weights = []
+    for v in obj.data.vertices:
+        for g in v.groups:
+            verts.append(v.index)
+            groups.append(g.group)
+            weights.append(g.weight)
+    return np.array(verts, dtype=np.int64), np.array(groups, dtype=np.int64), np.array(weights, dtype=np.float32)
 
-def get_vertex_uvs(obj):
-    if not obj.data.uv_layers:
-        return None
-    
-    uv_layer = obj.data.uv_layers.active.data
-    tbl = {}    
-    for loop in obj.data.loops:
-        tbl[loop.vertex_index] = uv_layer[loop.index].uv
-    
-    return tbl
+def vertex_influences(memberships, count, group_bones):
+    # numbones, and (count, width) weights and bone indices (group_bones remapped, -1 = padding or not a bone),
+    # from vertex_groups() output
+    verts, groups, weights = memberships
+    numbones = np.bincount(verts, minlength=count)
+    width = max(int(numbones.max()) if count else 0, 1)
+    slot = np.arange(len(verts)) - (np.cumsum(numbones) - numbones)[verts]
+    weight = np.zeros((count, width), dtype=np.float32)
+    bone = np.full((count, width), -1, dtype=np.int32)
+    weight[verts, slot] = weights
+    bone[verts, slot] = group_bones[groups]
+    return numbones, weight, bone
+
+def group_polygons(polys, material, bone, material_order):
+    # [(material, bone, polygon indices)], materials by material_order (first appearance in the whole mesh),
+    # then bones in order of first appearance within the material, polygons keep their order
+    if len(polys) == 0:
+        return []
+    # One integer key per (material, bone), both start at -1
+    keys = (material[polys] + 1) * (int(bone[polys].max()) + 2) + bone[polys] + 1
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    ranked = np.lexsort((first, material_order[polys[first]]))
+    grouped = np.split(polys[np.argsort(inverse, kind="stable")], np.cumsum(np.bincount(inverse))[:-1])
+    return [(int(material[polys[first[g]]]), int(bone[polys[first[g]]]), grouped[g]) for g in ranked]
+
+def classify_polygons(topology, influences):
+    # Static polygons have every corner bound to the same single bone at weight 1, the rest are dynamic. Both are
+    # grouped by material and by the bone of the first corner's first group, so a polygon's triangles stay in one
+    # index buffer.
+    loop_start, loop_total, corners, material_index = topology
+    numbones, weight, bone = influences
+    rigid = (numbones == 1) & (weight[:, 0] == 1) & (bone[:, 0] >= 0)
+
+    polys = np.arange(len(loop_start))
+    if len(polys) == 0:
+        return [], []
+    loops, sizes = polygon_loops(loop_start, loop_total, polys)
+    corner_verts = corners[loops]
+    first_bone = bone[corners[loop_start], 0]
+    # Per polygon counts over its run of loops: corners that are not rigid, and rigid corners on another bone
+    # than the first corner (e.g. a polygon across a joint), which can't share one bone's static mesh
+    starts = np.cumsum(sizes) - sizes
+    loose = np.add.reduceat((~rigid[corner_verts]).astype(np.int64), starts)
+    mixed = np.add.reduceat((bone[corner_verts, 0] != np.repeat(first_bone, sizes)).astype(np.int64), starts)
+    static = (loose == 0) & (mixed == 0)
+    _, first_seen, material_inverse = np.unique(material_index, return_index=True, return_inverse=True)
+    material_order = first_seen[material_inverse.reshape(-1)]
+    return (group_polygons(polys[static], material_index, first_bone, material_order),
+        group_polygons(polys[~static], material_index, first_bone, material_order))
+
+def weld_vertices(points, tolerance):
+    # Keeps the first point of every tolerance sized grid cell
+    if tolerance <= 0 or len(points) == 0:
+        return points
+    cells = np.floor(points / tolerance).astype(np.int64)
+    _, first = np.unique(cells, axis=0, return_index=True)
+    return points[np.sort(first)]
+
+def face_planes(points, faces):
+    a, b, c = points[faces[:, 0]], points[faces[:, 1]], points[faces[:, 2]]
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1)
+    normals = normals / np.where(lengths > 0, lengths, 1.0)[:, None]
+    return normals, np.einsum("ij,ij->i", normals, a)
+
+def flat_hull(points, max_vertices=0):
+    """
+    convex_hull() of points without volume: the 2D hull in their plane, counter-clockwise around the plane normal,
+    a segment's two ends, or a single point. Above max_vertices, evenly spaced hull vertices are kept (still convex).
+    The polygon is fanned into triangles for both sides, each counter-clockwise seen from its side.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    no_faces = np.zeros((0, 3), dtype=np.int64)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64), no_faces
+    eps = 1e-9 * max(float(np.abs(points).max()), 1.0)
+    offsets = points - points.mean(axis=0)
+    axes = np.linalg.svd(offsets, full_matrices=False)[2]
+    plane = offsets @ axes[:2].T
+    if np.abs(plane[:, 0]).max() <= eps:
+        return np.zeros(1, dtype=np.int64), no_faces
+    if len(axes) < 2 or np.abs(plane[:, 1]).max() <= eps:
+        return np.array([np.argmin(plane[:, 0]), np.argmax(plane[:, 0])], dtype=np.int64), no_faces
+
+    # Monotone chain: lower then upper hull, collinear points dropped
+    def chain(order):
+        hull = []
+        for i in order:
+            while len(hull) >= 2:
+                a, b = plane[hull[-2]], plane[hull[-1]]
+                if (b[0] - a[0]) * (plane[i, 1] - a[1]) - (b[1] - a[1]) * (plane[i, 0] - a[0]) > eps * eps:
+                    break
+                hull.pop()
+            hull.append(int(i))
+        return hull[:-1]
+    order = np.lexsort((plane[:, 1], plane[:, 0]))
+    hull = np.array(chain(order) + chain(order[::-1]), dtype=np.int64)
+    if max_vertices > 0 and len(hull) > max_vertices:
+        hull = hull[np.linspace(0, len(hull), max_vertices, endpoint=False).astype(np.int64)]
+
+    fan = np.arange(1, len(hull) - 1)
+    front = np.stack([np.zeros_like(fan), fan, fan + 1], axis=1)
+    return hull, np.concatenate((front, front[:, ::-1])).reshape(-1, 3)
+
+def convex_hull(points, max_vertices=0):
+    """
+    Quickhull. Returns (vertex indices into points, triangles indexing the returned vertices),
+    triangles are counter-clockwise seen from outside.
+    Points are added farthest first, so with max_vertices the result is the hull of the
+    max_vertices most significant points. Flat or degenerate input goes to flat_hull().
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count = len(points)
+    if count < 4:
+        return flat_hull(points, max_vertices)
+    eps = 1e-9 * max(float(np.abs(points).max()), 1.0)
+
+    # Initial tetrahedron from extreme points
+    extent = points.max(axis=0) - points.min(axis=0)
+    axis = int(np.argmax(extent))
+    i0, i1 = int(np.argmin(points[:, axis])), int(np.argmax(points[:, axis]))
+    if extent[axis] <= eps:
+        return flat_hull(points, max_vertices)
+    line = points[i1] - points[i0]
+    i2 = int(np.argmax(np.linalg.norm(np.cross(points - points[i0], line), axis=1)))
+    normal = np.cross(line, points[i2] - points[i0])
+    if np.linalg.norm(normal) <= eps * eps:
+        return flat_hull(points, max_vertices)
+    height = (points - points[i0]) @ (normal / np.linalg.norm(normal))
+    i3 = int(np.argmax(np.abs(height)))
+    if abs(height[i3]) <= eps:
+        return flat_hull(points, max_vertices)
+
+    faces = np.array([[i0, i1, i2], [i0, i3, i1], [i1, i3, i2], [i2, i3, i0]], dtype=np.int64)
+    if height[i3] > 0:
+        faces = faces[:, ::-1].copy()
+    normals, offsets = face_planes(points, faces)
+    alive = np.ones(len(faces), dtype=bool)
+
+    # owner: face a point is outside of, -1 inside, -2 on the hull
+    owner = np.full(count, -1, dtype=np.int64)
+    owner[[i0, i1, i2, i3]] = -2
+    rest = np.nonzero(owner == -1)[0]
+    dist = points[rest] @ normals.T - offsets
+    best = np.argmax(dist, axis=1)
+    outside = dist[np.arange(len(rest)), best] > eps
+    owner[rest[outside]] = best[outside]
+
+    hull_vertices = 4
+    while max_vertices <= 0 or hull_vertices < max_vertices:
+        candidates = np.nonzero(owner >= 0)[0]
+        if len(candidates) == 0:
+            break
+        dist = np.einsum("ij,ij->i", points[candidates], normals[owner[candidates]]) - offsets[owner[candidates]]
+        apex = int(candidates[np.argmax(dist)])
+
+        live = np.nonzero(alive)[0]
+        visible = live[normals[live] @ points[apex] - offsets[live] > eps]
+        edges = set()
+        for a, b, c in faces[visible]:
+            edges.update(((a, b), (b, c), (c, a)))
+        horizon = [(a, b) for a, b in edges if (b, a) not in edges]
+        alive[visible] = False
 
-def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_path):
+        new_faces = np.array([(a, b, apex) for a, b in horizon], dtype=np.int64).reshape(-1, 3)
+        new_normals, new_offsets = face_planes(points, new_faces)
+        new_ids = np.arange(len(faces), len(faces) + len(new_faces))
+        faces = np.concatenate((faces, new_faces))
+        normals = np.concatenate((normals, new_normals))
+        offsets = np.concatenate((offsets, new_offsets))
+        alive = np.concatenate((alive, np.ones(len(new_faces), dtype=bool)))
+
+        owner[apex] = -2
+        hull_vertices = hull_vertices + 1
+        orphans = np.nonzero(np.isin(owner, visible))[0]
+        if len(orphans):
+            dist = points[orphans] @ new_normals.T - new_offsets
+            best = np.argmax(dist, axis=1)
+            outside = dist[np.arange(len(orphans)), best] > eps
+            owner[orphans] = np.where(outside, new_ids[best], -1)
+
+    faces = faces[alive]
+    vertices, faces = np.unique(faces, return_inverse=True)
+    return vertices, faces.reshape(-1, 3)
+
+def build_hull(points, weld_tolerance=0.0, max_vertices=0):
+    # Welded, reduced convex hull for one mphysdata_st: (vertices, faces)
+    points = weld_vertices(np.asarray(points, dtype=np.float64), weld_tolerance)
+    vertices, faces = convex_hull(points, max_vertices)
+    return points[vertices], faces
+
+def hull_bounds(vertices):
+    # Bone-local AABB and bounding sphere (AABB center, farthest vertex) of one mphysdata_st
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return np.zeros(3), np.zeros(3), np.zeros(3), 0.0
+    mins = vertices.min(axis=0)
+    maxs = vertices.max(axis=0)
+    center = (mins + maxs) / 2
+    radius = float(np.sqrt(((vertices - center) ** 2).sum(axis=1).max()))
+    return mins, maxs, center, radius
+
+def transform_bounds(matrix, mins, maxs):
+    # AABBs (N,3) moved by a 3x3 or 4x4 matrix, still axis aligned
+    matrix = np.asarray(matrix, dtype=np.float64)
+    center = (mins + maxs) / 2 @ matrix[:3, :3].T
+    if matrix.shape[0] == 4:
+        center += matrix[:3, 3]
+    extent = (maxs - mins) / 2 @ np.abs(matrix[:3, :3]).T
+    return center - extent, center + extent
+
+def physics_shape(points, bone_rest, hull=True, weld_tolerance=0.0, max_vertices=0):
+    # One mphysdata_st from its armature space points. bone_rest is the bone's Bone.matrix_local, the rest pose
+    # matrix a reader's Skeleton/PoseEvaluator builds from the MADL bone table, so vertices and bounds are stored
+    # in that bone space and the armature space rest AABB is what MPHYFile.refit() gives for the rest pose.
+    # Returns vertices, faces, (mins, maxs, center, radius) and (rest_mins, rest_maxs).
+    bone_rest = np.asarray(bone_rest, dtype=np.float64)
+    points = transform_points(np.linalg.inv(bone_rest), points)
+    if hull:
+        points, faces = build_hull(points, weld_tolerance, max_vertices)
+    else:
+        faces = np.zeros((0, 3), dtype=np.int64)
+    bounds = hull_bounds(points)
+    return points, faces, bounds, transform_bounds(bone_rest, bounds[0][None], bounds[1][None])
+
+def build_bvh(mins, maxs):
+    # Binary BVH over boxes (N,3), median split on the longest centroid axis.
+    # Nodes are in depth-first order, left child is always the next node, leaves hold one box.
+    # Returns node mins, maxs and left/right/box index columns (-1 where not used).
+    count = len(mins)
+    centers = (mins + maxs) / 2
+    node_mins, node_maxs, left, right, box = [], [], [], [], []
+    stack = [(np.arange(count), -1)]
+    while stack:
+        items, parent = stack.pop()
+        node = len(box)
+        if parent >= 0:
+            if left[parent] < 0:
+                left[parent] = node
+            else:
+                right[parent] = node
+        node_mins.append(mins[items].min(axis=0))
+        node_maxs.append(maxs[items].max(axis=0))
+        left.append(-1)
+        right.append(-1)
+        if len(items) == 1:
+            box.append(int(items[0]))
+            continue
+        box.append(-1)
+        axis = int(np.argmax(np.ptp(centers[items], axis=0)))
+        items = items[np.argsort(centers[items, axis], kind="stable")]
+        half = len(items) // 2
+        # right half is pushed first so the left child is the next node
+        stack.append((items[half:], node))
+        stack.append((items[:half], node))
+    return (np.array(node_mins, dtype=np.float64).reshape(-1, 3), np.array(node_maxs, dtype=np.float64).reshape(-1, 3),
+        np.array(left, dtype=np.int64), np.array(right, dtype=np.int64), np.array(box, dtype=np.int64))
+
+def bone_lookup(rig, objs):
+    # Built once per export. Bone name -> index (rig.data.bones order, same as rig.pose.bones), and for every
+    # object vertex group index -> bone index, matched by name: group order is not bone order. -1 = not a bone.
+    bone_index = {bone.name: i for i, bone in enumerate(rig.data.bones)}
+    group_bones = {}
+    for obj in objs:
+        group_bones[obj] = np.array([bone_index.get(vg.name, -1) for vg in obj.vertex_groups], dtype=np.int64)
+    return bone_index, group_bones
+
+def vertex_group_index(memberships, group_count):
+    # Group -> vertex indices for every vertex group, from vertex_groups() output.
+    # Vertices of group g are group_verts[group_starts[g]:group_starts[g + 1]], in vertex order.
+    verts, groups, _ = memberships
+    order = np.argsort(groups, kind="stable")
+    counts = np.bincount(groups, minlength=group_count)
+    group_starts = np.concatenate(([0], np.cumsum(counts)))
+    return verts[order], group_starts
+
+def index_polygons(topology, polys, loop_uvs):
+    # Vertex pool deduplicated by (vertex, uv), so a vertex is only split where its corners have different UVs
+    # (seams), and the fan triangulated triangle list (indices into the pool).
+    # Returns mesh vertex index and UV of every pool entry, and the triangles.
+    loop_start, loop_total, corners, _ = topology
+    loops, sizes = polygon_loops(loop_start, loop_total, polys)
+    corner_verts = corners[loops]
+    # Exact UV bits as one integer (+ 0.0 folds -0.0 into 0.0), numbered, then paired with the vertex
+    corner_uvs = np.ascontiguousarray(loop_uvs[loops] + np.float32(0.0), dtype=np.float32)
+    uv_ids, uv_inverse = np.unique(corner_uvs.view(np.uint64).reshape(-1), return_inverse=True)
+    keys = corner_verts * len(uv_ids) + uv_inverse.reshape(-1)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    pool = corner_verts[first]
+    pool_uvs = corner_uvs[first]
+
+    starts = np.cumsum(sizes) - sizes
+    tri_counts = np.maximum(sizes - 2, 0)
+    tri_poly = np.repeat(np.arange(len(polys)), tri_counts)
+    tri_fan = np.arange(int(tri_counts.sum())) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts) + 1
+    first = starts[tri_poly]
+    triangles = np.stack([first, first + tri_fan, first + tri_fan + 1], axis=1)
+
+    return pool, pool_uvs, inverse.reshape(-1)[triangles].reshape(-1)
+
+def index_block(indices, vertices_count):
+    index_size = 2 if vertices_count <= 0xFFFF else 4
+    return index_size, np.ascontiguousarray(indices, dtype=index_size == 2 and "<u2" or "<u4")
+
+def get_loop_uvs(obj):
+    # (loops, 2) UVs of the active layer, one per polygon corner, zeros without a UV layer
+    uvs = np.zeros(len(obj.data.loops) * 2, dtype=np.float32)
+    if obj.data.uv_layers and obj.data.uv_layers.active:
+        obj.data.uv_layers.active.data.foreach_get("uv", uvs)
+    return uvs.reshape(-1, 2)
+
+# ANIMATION SAMPLING
+def pose_bone_order(pose_bones):
+    # Pose bones with every parent before its children
+    order = []
+    seen = set()
+    def visit(bone):
+        if bone.name in seen:
+            return
+        if bone.parent != None:
+            visit(bone.parent)
+        seen.add(bone.name)
+        order.append(bone)
+    for bone in pose_bones:
+        visit(bone)
+    return order
+
+def can_sample_fcurves(rig):
+    # Curves alone give the pose only if nothing else moves the bones
+    if rig.animation_data and len(rig.animation_data.drivers) > 0:
+        return False
+    for bone in rig.pose.bones:
+        if len(bone.constraints) > 0:
+            return False
+        if not bone.bone.use_inherit_rotation or bone.bone.inherit_scale != 'FULL' or not bone.bone.use_local_location:
+            return False
+    return True
+
+def evaluate_fcurves(fcurves, frames, defaults):
+    # (frames, channels) values, channels without a curve keep their current value
+    values = np.empty((len(frames), len(defaults)), dtype=np.float64)
+    for i, default in enumerate(defaults):
+        fcurve = fcurves.get(i)
+        if fcurve == None:
+            values[:, i] = default
+        else:
+            values[:, i] = [fcurve.evaluate(frame) for frame in frames]
+    return values
+
+def euler_to_matrix(euler, order):
+    # (N,3) angles -> (N,3,3), order as in Blender: "XYZ" rotates around X first
+    axes = {"X": 0, "Y": 1, "Z": 2}
+    result = np.broadcast_to(np.eye(3), (len(euler), 3, 3)).copy()
+    for axis in order:
+        i = axes[axis]
+        j, k = (i + 1) % 3, (i + 2) % 3
+        c, s = np.cos(euler[:, i]), np.sin(euler[:, i])
+        rot = np.zeros((len(euler), 3, 3))
+        rot[:, i, i] = 1
+        rot[:, j, j] = c
+        rot[:, j, k] = -s
+        rot[:, k, j] = s
+        rot[:, k, k] = c
+        result = rot @ result
+    return result
+
+def bone_basis(pose_bone, channels, frames):
+    # (frames,4,4) pose bone basis (location, rotation, scale) from the action's curves
+    count = len(frames)
+    location = evaluate_fcurves(channels.get("location", {}), frames, pose_bone.location)
+    scale = evaluate_fcurves(channels.get("scale", {}), frames, pose_bone.scale)
+    mode = pose_bone.rotation_mode
+    if mode == 'QUATERNION':
+        rotation = quaternion_to_matrix(evaluate_fcurves(channels.get("rotation_quaternion", {}), frames, pose_bone.rotation_quaternion))
+    elif mode == 'AXIS_ANGLE':
+        axis_angle = evaluate_fcurves(channels.get("rotation_axis_angle", {}), frames, pose_bone.rotation_axis_angle)
+        half = axis_angle[:, 0] / 2
+        axis = axis_angle[:, 1:] / np.maximum(np.linalg.norm(axis_angle[:, 1:], axis=1, keepdims=True), 1e-12)
+        rotation = quaternion_to_matrix(np.concatenate((np.cos(half)[:, None], axis * np.sin(half)[:, None]), axis=1))
+    else:
+        rotation = euler_to_matrix(evaluate_fcurves(channels.get("rotation_euler", {}), frames, pose_bone.rotation_euler), mode)
+
+    basis = np.zeros((count, 4, 4), dtype=np.float64)
+    basis[:, :3, :3] = rotation * scale[:, None, :]
+    if not pose_bone.bone.use_connect:
+        basis[:, :3, 3] = location
+    basis[:, 3, 3] = 1
+    return basis
+
+def sample_action_fcurves(rig, action, frames, index=None):
+    # (frames, bones, 4, 4) armature space pose matrices (PoseBone.matrix) straight from action.fcurves,
+    # bones in rig.pose.bones order. No frame_set, so no depsgraph evaluation per frame.
+    # index: bone_lookup() name -> index table, built here if not given
+    channels = defaultdict(dict)
+    for fcurve in action.fcurves:
+        path = fcurve.data_path
+        if not path.startswith('pose.bones["'):
+            continue
+        bone_name, _, prop = path[len('pose.bones["'):].partition('"].')
+        channels[(bone_name, prop)][fcurve.array_index] = fcurve
+
+    if index == None:
+        index = {bone.name: i for i, bone in enumerate(rig.pose.bones)}
+    matrices = np.zeros((len(frames), len(index), 4, 4), dtype=np.float64)
+    for pose_bone in pose_bone_order(rig.pose.bones):
+        bone_channels = {prop: channels.get((pose_bone.name, prop), {}) for prop in ("location", "scale", "rotation_quaternion", "rotation_axis_angle", "rotation_euler")}
+        basis = bone_basis(pose_bone, bone_channels, frames)
+        rest = np.array(pose_bone.bone.matrix_local, dtype=np.float64)
+        if pose_bone.parent != None:
+            parent_rest = np.array(pose_bone.parent.bone.matrix_local, dtype=np.float64)
+            matrices[:, index[pose_bone.name]] = matrices[:, index[pose_bone.parent.name]] @ (np.linalg.inv(parent_rest) @ rest) @ basis
+        else:
+            matrices[:, index[pose_bone.name]] = rest @ basis
+    return matrices
+
+def sample_action_scene(rig, action, frames):
+    # Same as sample_action_fcurves through the depsgraph, for rigs with constraints or drivers
+    scene = bpy.context.scene
+    old_frame = scene.frame_current
+    old_action = rig.animation_data.action
+    old_pose_position = rig.data.pose_position
+    rig.animation_data.action = action
+    rig.data.pose_position = 'POSE'
+    matrices = np.zeros((len(frames), len(rig.pose.bones), 4, 4), dtype=np.float64)
+    buffer = np.zeros(len(rig.pose.bones) * 16, dtype=np.float32)
+    try:
+        for i, frame in enumerate(frames):
+            scene.frame_set(frame)
+            # One call for every bone, matrices come out column major
+            rig.pose.bones.foreach_get("matrix", buffer)
+            matrices[i] = buffer.reshape(-1, 4, 4).transpose(0, 2, 1)
+    finally:
+        rig.animation_data.action = old_action
+        rig.data.pose_position = old_pose_position
+        scene.frame_set(old_frame)
+    return matrices
+
+def interpolation_error(positions, rotations, first, last):
+    # Error of frames first..last against linear (position) and slerp (rotation) interpolation between the two
+    t = ((np.arange(first, last + 1) - first) / (last - first))[:, None, None]
+    pos = positions[first] + (positions[last] - positions[first]) * t
+    rot = quaternion_slerp(rotations[first][None], rotations[last][None], t)
+    pos_error = np.linalg.norm(pos - positions[first:last + 1], axis=-1)
+    rot_error = 2 * np.arccos(np.clip(np.abs((rot * rotations[first:last + 1]).sum(axis=-1)), 0.0, 1.0))
+    return np.maximum(pos_error, rot_error).max(axis=1)
+
+def reduce_keyframes(positions, rotations, tolerance, forced=()):
+    # Indices of the frames to keep so that every dropped frame is within tolerance (units for position,
+    # radians for rotation) of the interpolation between its neighbouring kept frames, for every bone.
+    # positions (frames, bones, 3), rotations (frames, bones, 4). First, last and forced frames are always kept.
+    count = len(positions)
+    if count <= 2 or tolerance <= 0:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[np.asarray(forced, dtype=np.int64)] = True
+    kept = np.nonzero(keep)[0]
+    stack = list(zip(kept[:-1], kept[1:]))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        error = interpolation_error(positions, rotations, first, last)
+        worst = int(np.argmax(error))
+        if error[worst] > tolerance:
+            split = first + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.nonzero(keep)[0]
+
+def channel_ranges(values, bits):
+    # Per channel min and step for values (N, channels...) so that min + q * step, q in [0, 2^bits - 1], covers them.
+    # Widened by two steps on each side, closed loop deltas drift from the open loop ones by up to a step.
+    # Rounded to float32 like in the file, so the encoder decodes exactly what a reader will.
+    if len(values) == 0:
+        return np.zeros(values.shape[1:]), np.full(values.shape[1:], 1e-9, dtype=np.float32).astype(np.float64)
+    low = values.min(axis=0)
+    step = (np.maximum(values.max(axis=0) - low, 1e-9) / ((1 << bits) - 5)).astype(np.float32).astype(np.float64)
+    return (low - 2 * step).astype(np.float32).astype(np.float64), step
+
+def quantize_sequence(positions, rotations, rest_positions, rest_rotations, snapshot, bits, tolerance=0.0):
+    # Fixed point encoding of stored frames (keys, bones, ...) with per-sequence, per-bone ranges.
+    # Deltas are taken against the decoded previous frame (closed loop), so quantization error does not add up,
+    # and channels that moved less than tolerance (or half a step) since the decoded previous frame are left out.
+    # Rotation deltas are smallest-three quaternions. Returns a dict of arrays, see the end of the function.
+    levels = (1 << bits) - 1
+    keys, bones = positions.shape[:2]
+    prev_positions = np.where(snapshot[:, None, None], rest_positions[None], np.roll(positions, 1, axis=0))
+    prev_rotations = np.where(snapshot[:, None, None], rest_rotations[None], np.roll(rotations, 1, axis=0))
+    open_pos = positions - prev_positions
+    open_rot = smallest_three(quaternion_multiply(rotations, quaternion_inverse(prev_rotations)))[1]
+
+    # [0] delta frames, [1] snapshot frames
+    pos_min, pos_step, rot_min, rot_step = [], [], [], []
+    for kind in (False, True):
+        low, step = channel_ranges(open_pos[snapshot == kind], bits)
+        pos_min.append(low)
+        pos_step.append(step)
+        # one range for all three stored components, which component is stored where changes between frames
+        low, step = channel_ranges(open_rot[snapshot == kind].transpose(0, 2, 1).reshape(-1, bones), bits)
+        rot_min.append(low)
+        rot_step.append(step)
+
+    pos_q = np.zeros((keys, bones, 3), dtype=np.int64)
+    pos_mask = np.zeros((keys, bones, 3), dtype=bool)
+    rot_largest = np.zeros((keys, bones), dtype=np.int64)
+    rot_q = np.zeros((keys, bones, 3), dtype=np.int64)
+    rot_mask = np.zeros((keys, bones), dtype=bool)
+    pos_error = np.zeros(bones)
+    rot_error = np.zeros(bones)
+    decoded_pos = rest_positions.copy()
+    decoded_rot = rest_rotations.copy()
+    for k in range(keys):
+        kind = int(snapshot[k])
+        base_pos = rest_positions if kind else decoded_pos
+        base_rot = rest_rotations if kind else decoded_rot
+
+        delta = positions[k] - base_pos
+        q = np.clip(np.rint((delta - pos_min[kind]) / pos_step[kind]), 0, levels)
+        pos_mask[k] = True if kind else np.abs(delta) > np.maximum(pos_step[kind] / 2, tolerance)
+        pos_q[k] = q
+        decoded_pos = base_pos + np.where(pos_mask[k], pos_min[kind] + q * pos_step[kind], 0.0)
+
+        relative = quaternion_multiply(rotations[k], quaternion_inverse(base_rot))
+        largest, three = smallest_three(relative)
+        q = np.clip(np.rint((three - rot_min[kind][:, None]) / rot_step[kind][:, None]), 0, levels)
+        rot_mask[k] = True if kind else quaternion_angle(relative, np.array([1.0, 0.0, 0.0, 0.0])) > np.maximum(rot_step[kind], tolerance)
+        rot_largest[k] = largest
+        rot_q[k] = q
+        step = quaternion_multiply(from_smallest_three(largest, rot_min[kind][:, None] + q * rot_step[kind][:, None]), base_rot)
+        decoded_rot = np.where(rot_mask[k][:, None], step / np.linalg.norm(step, axis=-1, keepdims=True), base_rot)
+
+        pos_error = np.maximum(pos_error, np.abs(decoded_pos - positions[k]).max(axis=-1))
+        rot_error = np.maximum(rot_error, quaternion_angle(decoded_rot, rotations[k]))
+
+    return {
+        "pos_q": pos_q, "pos_mask": pos_mask,
+        "rot_largest": rot_largest, "rot_q": rot_q, "rot_mask": rot_mask,
+        "pos_min": np.stack(pos_min), "pos_step": np.stack(pos_step),
+        "rot_min": np.stack(rot_min), "rot_step": np.stack(rot_step),
+        "pos_error": pos_error, "rot_error": rot_error,
+    }
+
+def delta_channels(positions, rotations, rest_positions, rest_rotations, snapshot, epsilon=0.0):
+    # Half float channels of stored frames (keys, bones, ...): deltas against the previous stored frame,
+    # or against the rest pose on snapshot frames. Rotation is XYZ euler of current * previous^-1.
+    # A channel is only flagged (MBONEFLAGS) if it changed by more than epsilon. Deltas are taken against
+    # what a reader decodes (half floats, left out channels), so neither skipped changes nor rounding add up.
+    keys, bones = positions.shape[:2]
+    delta_pos = np.zeros((keys, bones, 3))
+    delta_rot = np.zeros((keys, bones, 3))
+    changed = np.zeros((keys, bones, 6), dtype=bool)
+    decoded_pos = rest_positions.copy()
+    decoded_rot = rest_rotations.copy()
+    for k in range(keys):
+        base_pos = rest_positions if snapshot[k] else decoded_pos
+        base_rot = rest_rotations if snapshot[k] else decoded_rot
+
+        delta = positions[k] - base_pos
+        changed[k, :, :3] = snapshot[k] or np.abs(delta) > epsilon
+        delta_pos[k] = np.where(changed[k, :, :3], delta, 0.0).astype(np.float16)
+        decoded_pos = base_pos + delta_pos[k]
+
+        euler = quaternion_to_euler(quaternion_multiply(rotations[k], quaternion_inverse(base_rot)))
+        changed[k, :, 3:] = snapshot[k] or np.abs(euler) > epsilon
+        delta_rot[k] = np.where(changed[k, :, 3:], euler, 0.0).astype(np.float16)
+        step = quaternion_multiply(euler_to_quaternion(delta_rot[k]), base_rot)
+        decoded_rot = step / np.linalg.norm(step, axis=-1, keepdims=True)
+
+    bone_flags = (changed * (1 << np.arange(6))).sum(axis=-1)
+    return delta_pos, delta_rot, bone_flags
+
+def half_frames(frames, keys, snapshot, delta_pos, delta_rot, bone_flags):
+    # manimdata_st list from delta_channels() output, bones without a flagged channel are left out
+    bone_index = np.arange(bone_flags.shape[1])
+    data_arr = []
+    for k, key in enumerate(keys):
+        ManiData = manimdata_st()
+        ManiData.frame = frames[key]
+        ManiData.flags = MFRAMEFLAGS.SNAPSHOT if snapshot[k] else 0
+        ManiData.bone = BoneChannels(bone_flags[k], bone_index, delta_pos[k], delta_rot[k]).changed()
+        data_arr.append(ManiData)
+    return data_arr
+
+def quantized_frames(frames, keys, snapshot, encoded):
+    # manimdata_st list from quantize_sequence() output
+    bone_index = np.arange(encoded["pos_q"].shape[1])
+    pos_flags = (encoded["pos_mask"] * np.array([MBONEFLAGS.POSX, MBONEFLAGS.POSY, MBONEFLAGS.POSZ])).sum(axis=-1)
+    rot_flags = encoded["rot_mask"] * (MBONEFLAGS.ROTX | MBONEFLAGS.ROTY | MBONEFLAGS.ROTZ)
+    bone_flags = pos_flags | rot_flags
+    data_arr = []
+    for k, key in enumerate(keys):
+        ManiData = manimdata_st()
+        ManiData.frame = frames[key]
+        ManiData.flags = MFRAMEFLAGS.SNAPSHOT if snapshot[k] else 0
+        ManiData.bone = BoneChannels(bone_flags[k], bone_index, encoded["pos_q"][k], encoded["rot_q"][k], encoded["rot_largest"][k]).changed()
+        data_arr.append(ManiData)
+    return data_arr
+
+def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_path, texture_cache_path=None, vtf_workers=0, vtf_timeout=120, phy_hull=True, phy_max_vertices=64, phy_weld=0.001, anim_tolerance=0.0005, anim_snapshot_interval=30, anim_encoding='HALF', anim_bits=16):
     MADL = madl_st()
     MTEX = mtex_st()
     MPHY = mphy_st()
@@ -210,8 +996,14 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
     rig.data.pose_position = 'REST'
     objs = get_objects_parented_to_rig(rig)
     objects_uvs = {}
+    objects_local = {}
+    objects_armature = {}
+    bone_inverses = {}
     for obj in objs:
-        objects_uvs[obj] = get_vertex_uvs(obj)
+        objects_uvs[obj] = get_loop_uvs(obj)
+        objects_local[obj] = get_vertex_arrays(obj)
+        objects_armature[obj] = get_vertices_armature_space(obj, rig, objects_local[obj])
+    bone_index, group_bones = bone_lookup(rig, objs)
         
     MADL.name = get_name(rig.name.split('.')[0])
     
@@ -230,8 +1022,15 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
         
         max_phys_index = 0
         phys_table = []
+        group_verts, group_starts = vertex_group_index(vertex_groups(phy_obj), len(phy_obj.vertex_groups))
+        armature_pos, _ = objects_armature[phy_obj]
         for vg in phy_obj.vertex_groups:
-            group_vertices = [v.index for v in obj.data.vertices if vg.index in [g.group for g in v.groups]]
+            group_vertices = group_verts[group_starts[vg.index]:group_starts[vg.index + 1]]
+            phy_bone = group_bones[phy_obj][vg.index]
+            if phy_bone < 0:
+                if len(group_vertices) > 0:
+                    self.report({'WARNING'},f"{phy_obj.name}: vertex group {vg.name} is not a bone, skipped.")
+                continue
 
             if len(group_vertices) > 0:
                 mphysdata = mphysdata_st()
@@ -239,92 +1038,94 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
                 mphysdata.index = max_phys_index
                 mphysdata.name = get_name(phy_obj.name+"_phy_"+str(max_phys_index))
                 mphysdata.parented = 1
-                mphysdata.boneIndex = vg.index
+                mphysdata.boneIndex = int(phy_bone)
                 mphysdata.position = mathutils.Vector((0.0, 0.0, 0.0))
                 mphysdata.angle = mathutils.Euler((0.0, 0.0, 0.0),'XYZ')
-                mphysdata.vertices_count = len(group_vertices)
-                vertices = []
-                for vert in group_vertices:
-                    pos,normal = get_vertex_position_and_normal(phy_obj,rig.data.bones[vg.index],vert)
-                    vertices.append(pos)
-                mphysdata.vertices = vertices
-                mphysdata.struct_size = 69 + len(group_vertices) * 12
+                pos, faces, bounds, rest_bounds = physics_shape(armature_pos[group_vertices], rig.data.bones[phy_bone].matrix_local,
+                    phy_hull, phy_weld, min(phy_max_vertices or 65535, 65535))
+                mphysdata.vertices = pos
+                mphysdata.vertices_count = len(pos)
+                mphysdata.faces = faces
+                mphysdata.struct_size = 69 + len(pos) * 12 + 4 + len(faces) * 6
+                mphysdata.mins, mphysdata.maxs, mphysdata.center, mphysdata.radius = bounds
+                mphysdata.rest_mins, mphysdata.rest_maxs = rest_bounds
                 phys_table.append(mphysdata)
         
+        # Broad phase over the whole model, built in rest pose
+        if len(phys_table) > 0:
+            MPHY.bvh = build_bvh(np.concatenate([phy.rest_mins for phy in phys_table]), np.concatenate([phy.rest_maxs for phy in phys_table]))
+        
     # TEXTURE
     texture_table = {}
     texture_max_index = 0
-    idx = 0
     vtf_mats = []
-    vtf_results = {}
-    vtf_threads = []
+    vtf_jobs = []
     if add_tex:
-        for obj in objs:
-            if len(obj.material_slots) == 0:
-                continue
-            for slot in obj.material_slots:
-                mat = slot.material
-                if mat in texture_table.keys() or mat in vtf_mats:
+        with TextureEncoder(texture_cache_path) as encoder, VtfScheduler(vtfcmd_path, vtf_workers, vtf_timeout) as scheduler:
+            for obj in objs:
+                if len(obj.material_slots) == 0:
                     continue
-                base_data = get_mat_base_texture(mat,tex_type)
-                base_texture = base_data[0]
-                bt_path = base_data[1]
-                emission_data = get_mat_emission(mat,tex_type)
-                emission = emission_data[0]
-                et_path = emission_data[1]
+                for slot in obj.material_slots:
+                    mat = slot.material
+                    if mat in texture_table.keys() or mat in vtf_mats:
+                        continue
+                    base_texture = get_mat_base_texture(mat,tex_type,encoder)
+                    emission = get_mat_emission(mat,tex_type,encoder)
                 
-                if tex_type != "VTF":
-                    mtexdata = mtexdata_st()
-                    texture_max_index = texture_max_index + 1
-                    mtexdata.texture = texture_max_index
-                    mtexdata.name = get_name(mat.name)
-                    mtexdata.data_length = len(base_texture)
-                    mtexdata.data = list(base_texture)
-                    if emission != None:
-                        mtexdata.emission = 1
-                        mtexdata.emission_data_length = len(emission)
-                        mtexdata.emission_data = list(emission)
+                    if tex_type != "VTF":
+                        mtexdata = mtexdata_st()
+                        texture_max_index = texture_max_index + 1
+                        mtexdata.texture = texture_max_index
+                        mtexdata.name = get_name(mat.name)
+                        if base_texture != None:
+                            mtexdata.data_length = len(base_texture)
+                            mtexdata.data = base_texture
+                        if emission != None:
+                            mtexdata.emission = 1
+                            mtexdata.emission_data_length = len(emission)
+                            mtexdata.emission_data = emission
                     
-                    mtexdata.struct_size = 45
+                        mtexdata.struct_size = 45
                     
-                    texture_table[mat] = mtexdata
-                else:
-                    vtf_mats.append(mat)
-                    p = threading.Thread(target=textureToVtf,
-                        args=(idx,mat, bt_path,emission != None and et_path or None,vtfcmd_path,vtf_results))
-                    vtf_threads.append(p)
-                    p.start()
-                    idx = idx + 1
-        if tex_type == "VTF":
-            for p in vtf_threads:
-                p.join()
+                        texture_table[mat] = mtexdata
+                    else:
+                        vtf_mats.append(mat)
+                        vtf_jobs.append((mat,
+                            schedule_vtf(scheduler,encoder,base_texture),
+                            schedule_vtf(scheduler,encoder,emission)))
                 
-        for idx,data in vtf_results.items():
-            mat = data[0]
-            base_data = data[1]
-            emission_data = data[2]
-            mtexdata = mtexdata_st()
-            texture_max_index = texture_max_index + 1
-            mtexdata.texture = texture_max_index
-            mtexdata.name = get_name(mat.name)
-            if base_data != None:
-                mtexdata.data_length = len(base_data)
-                mtexdata.data = list(base_data)
-            if emission_data != None:
-                mtexdata.emission = 1
-                mtexdata.emission_data_length = len(emission_data)
-                mtexdata.emission_data = list(emission_data)
+            for mat,base_job,emission_job in vtf_jobs:
+                self.report({'INFO'}, f"{mat.name}: converting textures to VTF")
+                try:
+                    base_data = base_job.result()
+                    emission_data = emission_job.result()
+                except VtfConversionError as e:
+                    scheduler.shutdown(cancel=True)
+                    self.report({'ERROR'},f"{mat.name}: {e}")
+                    rig.data.pose_position = 'POSE'
+                    return {'CANCELLED'}
+                mtexdata = mtexdata_st()
+                texture_max_index = texture_max_index + 1
+                mtexdata.texture = texture_max_index
+                mtexdata.name = get_name(mat.name)
+                if base_data != None:
+                    mtexdata.data_length = len(base_data)
+                    mtexdata.data = base_data
+                if emission_data != None:
+                    mtexdata.emission = 1
+                    mtexdata.emission_data_length = len(emission_data)
+                    mtexdata.emission_data = emission_data
             
-            mtexdata.struct_size = 45
+                mtexdata.struct_size = 45
             
-            texture_table[mat] = mtexdata
+                texture_table[mat] = mtexdata
             
     # BONES
     bones = list(rig.data.bones)
     bone_table = []
     for index, bone in enumerate(bones):
         if bone.parent:
-            parent_index = bones.index(bone.parent)
+            parent_index = bone_index[bone.parent.name]
             bone_position = bone.head_local - bone.parent.head_local
 
             euler_current = bone.matrix_local.to_quaternion()
@@ -352,9 +1153,8 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
     # ANIMATIONS
     anim_table = []
     anim_index = 0
-    flags = MBONEFLAGS()
     actions = []
-    if rig.animation_data:
+    if add_anim and rig.animation_data:
         if rig.animation_data.action:
             actions.append(rig.animation_data.action)
         
@@ -362,175 +1162,122 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
             for strip in track.strips:
                 if strip.action:
                     actions.append(strip.action)
+    use_fcurves = can_sample_fcurves(rig)
+    if len(actions) > 0:
+        rest_positions = np.array([bone.bone.head_local for bone in rig.pose.bones], dtype=np.float64).reshape(-1, 3)
+        rest_rotations = matrix_to_quaternion(np.array([bone.bone.matrix_local for bone in rig.pose.bones], dtype=np.float64).reshape(-1, 4, 4))
     for action in actions:
         ManiSeq = manimseq_st()
         ManiSeq.index = anim_index
         ManiSeq.name = get_name(action.name)
-        
-        rig.animation_data.action = action
 
         start_frame = int(action.frame_range[0])
         end_frame = int(action.frame_range[1])
-        ManiSeq.numFrames = end_frame
         ManiSeq.fps = bpy.context.scene.render.fps
 
-        rest_pose = {bone.name: (bone.bone.head_local.copy(), bone.bone.matrix_local.to_quaternion()) for bone in rig.pose.bones}
-        data_arr = []
-        
-        prev_transforms = {}
-        for frame in range(start_frame, end_frame + 1):
-            bpy.context.scene.frame_set(frame)
-            ManiData = manimdata_st()
-            ManiData.frame = frame
-            for index,bone in enumerate(rig.pose.bones):
-                BonePos = mbonepos_t()
-                bone_name = bone.name
-                current_pos = bone.head
-                current_rot = bone.matrix.to_quaternion()
-
-                if frame == start_frame:
-                    prev_pos, prev_rot = rest_pose[bone_name]
-                else:
-                    prev_pos, prev_rot = prev_transforms.get(bone_name, (current_pos, current_rot))
-
-                delta_pos = current_pos - prev_pos
-                delta_rot = (current_rot * prev_rot.inverted()).to_euler()
-                
-                Flags = flags.NOCHANGES
-                
-                # !!! CRINGE DETECTED !!!
-                if delta_pos.x == 0:
-                    Flags = Flags | flags.POSX
-                if delta_pos.y == 0:
-                    Flags = Flags | flags.POSY
-                if delta_pos.z == 0:
-                    Flags = Flags | flags.POSZ
-
-                if delta_rot.x == 0:
-                    Flags = Flags | flags.ROTX
-                if delta_rot.y == 0:
-                    Flags = Flags | flags.ROTY
-                if delta_rot.z == 0:
-                    Flags = Flags | flags.ROTZ
-                
-                prev_transforms[bone_name] = (current_pos, current_rot)
-                BonePos.flags = Flags
-                BonePos.boneIndex = index
-                BonePos.posX = delta_pos.x
-                BonePos.posY = delta_pos.y
-                BonePos.posZ = delta_pos.z
-                BonePos.rotX = delta_rot.x
-                BonePos.rotY = delta_rot.y
-                BonePos.rotZ = delta_rot.z
-                ManiData.bone.append(BonePos)
-            data_arr.append(ManiData)
+        frames = list(range(start_frame, end_frame + 1))
+        if use_fcurves:
+            matrices = sample_action_fcurves(rig, action, frames, bone_index)
+        else:
+            matrices = sample_action_scene(rig, action, frames)
+        positions = matrices[:, :, :3, 3]
+        rotations = matrix_to_quaternion(matrices)
+        # Snapshots (deltas against rest pose) every anim_snapshot_interval frames, so a reader can seek
+        # without replaying the sequence from its start
+        snapshots = np.arange(0, len(frames), anim_snapshot_interval or len(frames))
+        keys = reduce_keyframes(positions, rotations, anim_tolerance, snapshots)
+        snapshot = keys % (anim_snapshot_interval or len(frames)) == 0
+        ManiSeq.snapshot_interval = anim_snapshot_interval
+        ManiSeq.bone_count = len(rig.pose.bones)
+
+        if anim_encoding == 'QUANTIZED':
+            encoded = quantize_sequence(positions[keys], rotations[keys], rest_positions, rest_rotations, snapshot, anim_bits, anim_tolerance)
+            ManiSeq.encoding = MANIENCODING.QUANTIZED
+            ManiSeq.bits = anim_bits
+            ManiSeq.ranges = encoded
+            ManiSeq.frames = quantized_frames(frames, keys, snapshot, encoded)
+            ManiSeq.numFrames = len(ManiSeq.frames)
+            anim_table.append(ManiSeq)
+            anim_index = anim_index + 1
+            worst_pos = int(np.argmax(encoded["pos_error"]))
+            worst_rot = int(np.argmax(encoded["rot_error"]))
+            self.report({'INFO'}, f"{action.name}: {anim_bits} bit channels, max position error {encoded['pos_error'][worst_pos]:.6f} ({rig.pose.bones[worst_pos].name}), "
+                f"max rotation error {np.degrees(encoded['rot_error'][worst_rot]):.4f} deg ({rig.pose.bones[worst_rot].name})")
+            continue
+
+        delta_pos, delta_rot, bone_flags = delta_channels(positions[keys], rotations[keys], rest_positions, rest_rotations, snapshot, anim_tolerance)
+        data_arr = half_frames(frames, keys, snapshot, delta_pos, delta_rot, bone_flags)
         anim_index = anim_index + 1
+        ManiSeq.numFrames = len(data_arr)
         ManiSeq.frames = data_arr
         anim_table.append(ManiSeq)
-    MANI.num_sequences = len(bpy.data.actions)
+    MANI.num_sequences = len(anim_table)
         
     # SORTING
-    good_polys = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    bad_polys = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    
+    static_groups = []
+    dynamic_groups = []
+    objects_topology = {}
+    objects_influences = {}
     for obj in objs:
-        polyt = separate_polygons_by_material(obj)
-        for mat,polys in polyt.items():
-            for poly in polys:
-                valid_triag = True
-                for vert_ind in poly.vertices:
-                    vert = obj.data.vertices[vert_ind]
-                    groups = vert.groups
-                    if len(groups) != 1:
-                        valid_triag = False
-                        break
-                    if groups[0].weight != 1:
-                        valid_triag = False
-                        break
-                if valid_triag:
-                    for vert_ind in poly.vertices:
-                        vert = obj.data.vertices[vert_ind]
-                        good_polys[obj][mat][obj.vertex_groups[vert.groups[0].group].index].append(vert)
-                else:
-                    for vert_ind in poly.vertices:
-                        vert = obj.data.vertices[vert_ind]
-                        bad_polys[obj][mat][obj.vertex_groups[vert.groups[0].group].index].append(vert)
+        objects_topology[obj] = mesh_topology(obj)
+        objects_influences[obj] = vertex_influences(vertex_groups(obj), len(obj.data.vertices), group_bones[obj])
+        static, dynamic = classify_polygons(objects_topology[obj], objects_influences[obj])
+        static_groups += [(obj, polys, bone_ind) for _, bone_ind, polys in static]
+        dynamic_groups += [(obj, polys, bone_ind) for _, bone_ind, polys in dynamic]
                 
     # STATIC MESHES
     static_meshes = []
     max_static_meshes = 0
-    for obj,mat_list in good_polys.items():
-        for mat,bone_list in mat_list.items():
-            for bone_ind,vert_list in bone_list.items():
-                bone = rig.data.bones[bone_ind]
-                mstmesh = mstmesh_st()
-                max_static_meshes = max_static_meshes + 1
-                mstmesh.index = max_static_meshes
-                mstmesh.name = get_name(obj.name+"_sm_"+str(bone_ind))
-                mstmesh.parented = 1
-                mstmesh.boneIndex = bone_ind
-                mstmesh.position = mathutils.Vector((0.0,0.0,0.0))
-                mstmesh.angle = mathutils.Euler((0.0, 0.0, 0.0),'XYZ')
-                mstmesh.vertices_count = len(vert_list)
-                new_vert_array = []
-                for vert in vert_list:
-                    pos,normal = get_vertex_position_and_normal(obj,bone,vert.index)
-                    uvs_table = objects_uvs[obj]
-                    vertC = m_stvert_st()
-                    vertC.vert_position = pos
-                    vertC.vert_normal = normal
-                    vertC.vert_texcord = uvs_table[vert.index]
-                    new_vert_array.append(vertC)
-                mstmesh.vertices = new_vert_array
-                try:
-                    mstmesh.texture = texture_table[obj.material_slots[0].material].texture
-                except IndexError:
-                    mstmesh.texture = -1
-                except KeyError:
-                    mstmesh.texture = -1
-                static_meshes.append(mstmesh)
-                
+    for obj,polys,bone_ind in static_groups:
+        bone = rig.data.bones[bone_ind]
+        vert_indices, texcoord, indices = index_polygons(objects_topology[obj], polys, objects_uvs[obj])
+        mstmesh = mstmesh_st()
+        max_static_meshes = max_static_meshes + 1
+        mstmesh.index = max_static_meshes
+        mstmesh.name = get_name(obj.name+"_sm_"+str(bone_ind))
+        mstmesh.parented = 1
+        mstmesh.boneIndex = bone_ind
+        mstmesh.position = mathutils.Vector((0.0,0.0,0.0))
+        mstmesh.angle = mathutils.Euler((0.0, 0.0, 0.0),'XYZ')
+        mstmesh.vertices_count = len(vert_indices)
+        # Rest bone space: Skeleton.rest_matrices[boneIndex] @ vertex gives the armature space rest position back
+        armature_pos, armature_normal = objects_armature[obj]
+        pos,normal = to_bone_space(get_bone_inverse(bone, bone_inverses), armature_pos[vert_indices], armature_normal[vert_indices])
+        mstmesh.vertices = StaticVertices(pos, normal, texcoord)
+        mstmesh.indices = indices
+        try:
+            mstmesh.texture = texture_table[obj.material_slots[0].material].texture
+        except IndexError:
+            mstmesh.texture = -1
+        except KeyError:
+            mstmesh.texture = -1
+        static_meshes.append(mstmesh)
+        
     # DYNAMIC MESHES
     max_dynamic_meshes = 0
     dynamic_meshes = []
-    for obj,mat_list in bad_polys.items():
-        for mat,bone_list in mat_list.items():
-            for bone_ind,vert_list in bone_list.items():
-                bone = rig.data.bones[bone_ind]
-                dyn_st = mdynmesh_st()
-                max_dynamic_meshes = max_dynamic_meshes + 1
-                dyn_st.index = max_dynamic_meshes
-                dyn_st.name = get_name(obj.name+"_dm_"+str(max_dynamic_meshes))
-                try:
-                    dyn_st.texture = texture_table[obj.material_slots[0].material].texture
-                except IndexError:
-                    dyn_st.texture = -1
-                except KeyError:
-                    dyn_st.texture = -1
-                
-                uvs_table = objects_uvs[obj]
-                new_vert_table = []
-                for vert in vert_list:
-                    dynvert = mdynvert_st()
-                    numbones = 0
-                    weights = []
-                    bone = []
-                    for g in vert.groups:
-                        weights.append(g.weight)
-                        group_name = obj.vertex_groups[g.group].name
-                        bone.append(rig.data.bones.find(group_name))
-                        numbones = numbones + 1
-                    dynvert.numbones = numbones
-                    dynvert.weight = weights
-                    dynvert.bone = bone
-                    dynvert.struct_size = 33 + 8 * numbones
-                    dynvert.vert_position = vert.co
-                    dynvert.vert_normal = vert.normal
-                    dynvert.vert_texcoord = uvs_table[vert.index]
-                    new_vert_table.append(dynvert)
-                dyn_st.vertices_count = len(new_vert_table)
-                dyn_st.vertices = new_vert_table
-                dynamic_meshes.append(dyn_st)
+    for obj,polys,bone_ind in dynamic_groups:
+        vert_indices, texcoord, indices = index_polygons(objects_topology[obj], polys, objects_uvs[obj])
+        dyn_st = mdynmesh_st()
+        max_dynamic_meshes = max_dynamic_meshes + 1
+        dyn_st.index = max_dynamic_meshes
+        dyn_st.name = get_name(obj.name+"_dm_"+str(max_dynamic_meshes))
+        try:
+            dyn_st.texture = texture_table[obj.material_slots[0].material].texture
+        except IndexError:
+            dyn_st.texture = -1
+        except KeyError:
+            dyn_st.texture = -1
+        
+        numbones, weight, bone = (column[vert_indices] for column in objects_influences[obj])
+        # Armature space, what SkinnedMesh's pose @ inverse rest matrices expect
+        armature_pos, armature_normal = objects_armature[obj]
+        position = armature_pos[vert_indices]
+        normal = armature_normal[vert_indices]
+        dyn_st.vertices_count = len(vert_indices)
+        dyn_st.vertices = DynamicVertices(numbones, weight, bone, position, normal, texcoord)
+        dyn_st.indices = indices
+        dynamic_meshes.append(dyn_st)
     
     new_filepath = filepath[:-4]
     writeMADL(new_filepath,MADL,bone_table,static_meshes,dynamic_meshes)
@@ -541,206 +1288,227 @@ def main(self, context, filepath, add_tex, add_phy, add_anim, tex_type, vtfcmd_p
     rig.data.pose_position = 'POSE'
     return {'FINISHED'}
 
+def reserve(f, size):
+    # Placeholder for a field that is only known after the following sections are written
+    offset = f.tell()
+    f.write(bytes(size))
+    return offset
+
+def patch(f, offset, data):
+    end = f.tell()
+    f.seek(offset)
+    f.write(data)
+    f.seek(end)
+
 def writeMADL(filepath,MADL,bone_table,static_meshes,dynamic_meshes):
-    with io.BytesIO(b'') as madl:
+    with open(filepath+"madl", "wb") as madl:
         madl.write(MADL.id.to_bytes(4, byteorder="little"))
         madl.write(MADL.version.to_bytes(4, byteorder="little"))
         madl.write(MADL.checksum.to_bytes(4, byteorder="little", signed=True))
         madl.write(''.join(MADL.name).encode())
+        header_offset = reserve(madl, 24)
         
-        BonesSection = io.BytesIO(b'')
+        bones_offset = madl.tell() # Main header end
         for bone in bone_table:
-            BonesSection.write(bone.index.to_bytes(4,byteorder="little"))
-            BonesSection.write(''.join(bone.name).encode("utf-8"))
-            BonesSection.write(bone.parent.to_bytes(4,byteorder="little",signed=True))
-            BonesSection.write(struct.pack("<f", bone.bone_position[0]))
-            BonesSection.write(struct.pack("<f", bone.bone_position[1]))
-            BonesSection.write(struct.pack("<f", bone.bone_position[2]))
-            BonesSection.write(struct.pack("<f", bone.bone_angle[0]))
-            BonesSection.write(struct.pack("<f", bone.bone_angle[1]))
-            BonesSection.write(struct.pack("<f", bone.bone_angle[2]))
-            BonesSection.write(struct.pack("<f", bone.bone_angle[3]))
+            madl.write(bone.index.to_bytes(4,byteorder="little"))
+            madl.write(''.join(bone.name).encode("utf-8"))
+            madl.write(bone.parent.to_bytes(4,byteorder="little",signed=True))
+            madl.write(struct.pack("<f", bone.bone_position[0]))
+            madl.write(struct.pack("<f", bone.bone_position[1]))
+            madl.write(struct.pack("<f", bone.bone_position[2]))
+            madl.write(struct.pack("<f", bone.bone_angle[0]))
+            madl.write(struct.pack("<f", bone.bone_angle[1]))
+            madl.write(struct.pack("<f", bone.bone_angle[2]))
+            madl.write(struct.pack("<f", bone.bone_angle[3]))
         
-        StaticMeshSection = io.BytesIO(b'')
+        static_mesh_offset = madl.tell() # Bones section end
         for stm in static_meshes:
-            stm.struct_size = 70 + len(stm.vertices)*32
-            StaticMeshSection.write(stm.struct_size.to_bytes(4,byteorder="little"))
-            StaticMeshSection.write(stm.index.to_bytes(4,byteorder="little"))
-            StaticMeshSection.write(''.join(stm.name).encode("utf-8"))
-            StaticMeshSection.write(stm.parented.to_bytes(1,byteorder="little"))
-            StaticMeshSection.write(stm.boneIndex.to_bytes(4,byteorder="little"))
-            StaticMeshSection.write(struct.pack("<f", stm.position[0]))
-            StaticMeshSection.write(struct.pack("<f", stm.position[1]))
-            StaticMeshSection.write(struct.pack("<f", stm.position[2]))
-            StaticMeshSection.write(struct.pack("<f", stm.angle[0]))
-            StaticMeshSection.write(struct.pack("<f", stm.angle[1]))
-            StaticMeshSection.write(struct.pack("<f", stm.angle[2]))
-            StaticMeshSection.write(stm.vertices_count.to_bytes(4,byteorder="little"))
-            for vert in stm.vertices:
-                StaticMeshSection.write(struct.pack("<f", vert.vert_position[0]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_position[1]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_position[2]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_normal[0]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_normal[1]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_normal[2]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_texcoord[0]))
-                StaticMeshSection.write(struct.pack("<f", vert.vert_texcoord[1]))
-            StaticMeshSection.write(stm.texture.to_bytes(1,byteorder="little",signed=True))
+            index_size, indices = index_block(stm.indices, len(stm.vertices))
+            stm.struct_size = 75 + stm.vertices.nbytes + index_size*len(indices)
+            madl.write(stm.struct_size.to_bytes(4,byteorder="little"))
+            madl.write(stm.index.to_bytes(4,byteorder="little"))
+            madl.write(''.join(stm.name).encode("utf-8"))
+            madl.write(stm.parented.to_bytes(1,byteorder="little"))
+            madl.write(stm.boneIndex.to_bytes(4,byteorder="little"))
+            madl.write(struct.pack("<f", stm.position[0]))
+            madl.write(struct.pack("<f", stm.position[1]))
+            madl.write(struct.pack("<f", stm.position[2]))
+            madl.write(struct.pack("<f", stm.angle[0]))
+            madl.write(struct.pack("<f", stm.angle[1]))
+            madl.write(struct.pack("<f", stm.angle[2]))
+            madl.write(stm.vertices_count.to_bytes(4,byteorder="little"))
+            madl.write(stm.vertices.tobytes())
+            madl.write(index_size.to_bytes(1,byteorder="little"))
+            madl.write(len(indices).to_bytes(4,byteorder="little"))
+            madl.write(indices.tobytes())
+            madl.write(stm.texture.to_bytes(1,byteorder="little",signed=True))
             
-        DynamicVertxSection = io.BytesIO(b'')
+        dvertx_offset = madl.tell() # Static meshes section end
         for dvm in dynamic_meshes:
-            DynamicVertxSection.write(dvm.struct_size.to_bytes(4,byteorder="little"))
-            DynamicVertxSection.write(dvm.index.to_bytes(4,byteorder="little"))
-            DynamicVertxSection.write(''.join(dvm.name).encode("utf-8"))
-            DynamicVertxSection.write(dvm.vertices_count.to_bytes(4,byteorder="little"))
-            for vert in dvm.vertices:
-                DynamicVertxSection.write(vert.struct_size.to_bytes(4,byteorder="little"))
-                DynamicVertxSection.write(vert.numbones.to_bytes(1,byteorder="little"))
-                for weight in vert.weight:
-                    DynamicVertxSection.write(struct.pack("<f", weight))
-                for bone in vert.bone:
-                    DynamicVertxSection.write(bone.to_bytes(1,byteorder="little"))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_position[0]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_position[1]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_position[2]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_normal[0]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_normal[1]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_normal[2]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_texcoord[0]))
-                DynamicVertxSection.write(struct.pack("<f", vert.vert_texcoord[1]))
-            DynamicVertxSection.write(dvm.texture.to_bytes(1,byteorder="little",signed=True))
+            index_size, indices = index_block(dvm.indices, len(dvm.vertices))
+            dvm.struct_size = 46 + dvm.vertices.nbytes + index_size*len(indices)
+            madl.write(dvm.struct_size.to_bytes(4,byteorder="little"))
+            madl.write(dvm.index.to_bytes(4,byteorder="little"))
+            madl.write(''.join(dvm.name).encode("utf-8"))
+            madl.write(dvm.vertices_count.to_bytes(4,byteorder="little"))
+            madl.write(dvm.vertices.tobytes())
+            madl.write(index_size.to_bytes(1,byteorder="little"))
+            madl.write(len(indices).to_bytes(4,byteorder="little"))
+            madl.write(indices.tobytes())
+            madl.write(dvm.texture.to_bytes(1,byteorder="little",signed=True))
             
-        bones_offset = 68 # Main header end
         bones_count = len(bone_table)
-        static_mesh_offset = bones_offset+len(BonesSection.getvalue()) # Bones section end
         static_mesh_count = len(static_meshes)
-        dvertx_offset = static_mesh_offset+len(StaticMeshSection.getvalue()) # Static meshes section end
         dvertx_count = len(dynamic_meshes)
         
-        madl.write(bones_count.to_bytes(4,byteorder="little"))
-        madl.write(bones_offset.to_bytes(4,byteorder="little"))
-        madl.write(static_mesh_count.to_bytes(4,byteorder="little"))
-        madl.write(static_mesh_offset.to_bytes(4,byteorder="little"))
-        madl.write(dvertx_count.to_bytes(4,byteorder="little"))
-        madl.write(dvertx_offset.to_bytes(4,byteorder="little"))
-        
-        madl.write(BonesSection.getvalue())
-        madl.write(StaticMeshSection.getvalue())
-        madl.write(DynamicVertxSection.getvalue())
-        
-        with open(filepath+"madl", "wb") as f:
-            f.write(madl.getbuffer())
+        patch(madl, header_offset, struct.pack("<6i",
+            bones_count, bones_offset,
+            static_mesh_count, static_mesh_offset,
+            dvertx_count, dvertx_offset))
+
+def write_texture_payload(f, data, written):
+    # Identical payloads are stored once, later copies only point at the first one (v2+)
+    if len(data) > 0:
+        digest = hashlib.sha1(data).digest()
+        if digest in written:
+            f.write(struct.pack("<ii", -len(data), written[digest]))
+            return
+        written[digest] = f.tell() + 4
+    f.write(len(data).to_bytes(4,byteorder="little"))
+    f.write(data)
 
 def writeMTEX(filepath,MTEX,texture_table):
-    with io.BytesIO(b'') as mtex:        
+    with open(filepath+"mtex", "wb") as mtex:
         mtex.write(MTEX.id.to_bytes(4, byteorder="little"))
         mtex.write(MTEX.version.to_bytes(4, byteorder="little"))
         mtex.write(MTEX.checksum.to_bytes(4, byteorder="little", signed=True))
         
-        TextureDataSection = io.BytesIO(b'')
-        for mat,texture in texture_table.items():
-            texture.struct_size = 13 + 32 + texture.data_length + texture.emission_data_length
-            TextureDataSection.write(texture.struct_size.to_bytes(4,byteorder="little"))
-            TextureDataSection.write(texture.texture.to_bytes(4,byteorder="little"))
-            TextureDataSection.write(''.join(texture.name).encode("utf-8"))
-            TextureDataSection.write(texture.data_length.to_bytes(4,byteorder="little"))
-            TextureDataSection.write(''.join(texture.data).encode("utf-8"))
-            TextureDataSection.write(texture.emission.to_bytes(1,byteorder="little"))
-            TextureDataSection.write(texture.emission_data_length.to_bytes(4,byteorder="little"))
-            TextureDataSection.write(''.join(texture.emission_data).encode("utf-8"))
-        
-        tex_offset = 20 # Main header end
         tex_count = len(texture_table)
-        
         mtex.write(tex_count.to_bytes(4,byteorder="little"))
-        mtex.write(tex_offset.to_bytes(4,byteorder="little"))
-        
-        mtex.write(TextureDataSection.getvalue())
+        mtex.write((mtex.tell() + 4).to_bytes(4,byteorder="little")) # Main header end
         
-        with open(filepath+"mtex", "wb") as f:
-            f.write(mtex.getbuffer())
+        written = {}
+        for mat,texture in texture_table.items():
+            texture.data_length = len(texture.data)
+            texture.emission_data_length = len(texture.emission_data)
+            struct_offset = reserve(mtex, 4)
+            mtex.write(texture.texture.to_bytes(4,byteorder="little"))
+            mtex.write(''.join(texture.name).encode("utf-8"))
+            write_texture_payload(mtex, texture.data, written)
+            mtex.write(texture.emission.to_bytes(1,byteorder="little"))
+            write_texture_payload(mtex, texture.emission_data, written)
+            texture.struct_size = mtex.tell() - struct_offset - 4
+            patch(mtex, struct_offset, texture.struct_size.to_bytes(4,byteorder="little"))
 
 def writeMPHY(filepath,MPHY,phys_table):
-    with io.BytesIO(b'') as mphy:
+    with open(filepath+"mphy", "wb") as mphy:
         mphy.write(MPHY.id.to_bytes(4, byteorder="little"))
         mphy.write(MPHY.version.to_bytes(4, byteorder="little"))
         mphy.write(MPHY.checksum.to_bytes(4, byteorder="little", signed=True))
         
-        PhyDataSection = io.BytesIO(b'')
-        for phy in phys_table:
-            PhyDataSection.write(phy.struct_size.to_bytes(4,byteorder="little"))
-            PhyDataSection.write(phy.index.to_bytes(4,byteorder="little"))
-            PhyDataSection.write(''.join(phy.name).encode("utf-8"))
-            PhyDataSection.write(phy.parented.to_bytes(1,byteorder="little"))
-            PhyDataSection.write(phy.boneIndex.to_bytes(4,byteorder="little"))
-            PhyDataSection.write(struct.pack("<f", phy.position[0]))
-            PhyDataSection.write(struct.pack("<f", phy.position[1]))
-            PhyDataSection.write(struct.pack("<f", phy.position[2]))
-            PhyDataSection.write(struct.pack("<f", phy.angle[0]))
-            PhyDataSection.write(struct.pack("<f", phy.angle[1]))
-            PhyDataSection.write(struct.pack("<f", phy.angle[2]))
-            PhyDataSection.write(phy.vertices_count.to_bytes(4,byteorder="little"))
-            for vert in phy.vertices:
-                PhyDataSection.write(struct.pack("<f", vert[0]))
-                PhyDataSection.write(struct.pack("<f", vert[1]))
-                PhyDataSection.write(struct.pack("<f", vert[2]))
-        
-        phy_offset = 20 # Main header end
         phy_count = len(phys_table)
-        
         mphy.write(phy_count.to_bytes(4,byteorder="little"))
-        mphy.write(phy_offset.to_bytes(4,byteorder="little"))
+        mphy.write((mphy.tell() + 4).to_bytes(4,byteorder="little")) # Main header end
         
-        mphy.write(PhyDataSection.getvalue())
+        for phy in phys_table:
+            mphy.write(phy.struct_size.to_bytes(4,byteorder="little"))
+            mphy.write(phy.index.to_bytes(4,byteorder="little"))
+            mphy.write(''.join(phy.name).encode("utf-8"))
+            mphy.write(phy.parented.to_bytes(1,byteorder="little"))
+            mphy.write(phy.boneIndex.to_bytes(4,byteorder="little"))
+            mphy.write(struct.pack("<f", phy.position[0]))
+            mphy.write(struct.pack("<f", phy.position[1]))
+            mphy.write(struct.pack("<f", phy.position[2]))
+            mphy.write(struct.pack("<f", phy.angle[0]))
+            mphy.write(struct.pack("<f", phy.angle[1]))
+            mphy.write(struct.pack("<f", phy.angle[2]))
+            mphy.write(phy.vertices_count.to_bytes(4,byteorder="little"))
+            mphy.write(np.ascontiguousarray(phy.vertices, dtype="<f4").reshape(-1, 3).tobytes())
+            mphy.write(len(phy.faces).to_bytes(4,byteorder="little"))
+            mphy.write(np.ascontiguousarray(phy.faces, dtype="<u2").reshape(-1, 3).tobytes())
         
-        with open(filepath+"mphy", "wb") as f:
-            f.write(mphy.getbuffer())
+        # Optional trailing section, readers that only walk phy_count structs never reach it
+        if MPHY.bvh != None:
+            node_mins, node_maxs, left, right, box = MPHY.bvh
+            bounds = np.zeros(phy_count, dtype=mphybound_st)
+            bounds["mins"] = [phy.mins for phy in phys_table]
+            bounds["maxs"] = [phy.maxs for phy in phys_table]
+            bounds["center"] = [phy.center for phy in phys_table]
+            bounds["radius"] = [phy.radius for phy in phys_table]
+            nodes = np.zeros(len(box), dtype=mbvhnode_st)
+            nodes["mins"] = node_mins
+            nodes["maxs"] = node_maxs
+            nodes["left"] = left
+            nodes["right"] = right
+            nodes["phy"] = box
+            
+            mphy.write(b"MBVH")
+            mphy.write((4 + bounds.nbytes + 4 + nodes.nbytes).to_bytes(4,byteorder="little"))
+            mphy.write(phy_count.to_bytes(4,byteorder="little"))
+            mphy.write(bounds.tobytes())
+            mphy.write(len(nodes).to_bytes(4,byteorder="little"))
+            mphy.write(nodes.tobytes())
 
 def writeMANI(filepath,MANI,anim_table):
-    with io.BytesIO(b'') as mani:
+    with open(filepath+"mani", "wb") as mani:
         mani.write(MANI.id.to_bytes(4, byteorder="little"))
         mani.write(MANI.version.to_bytes(4, byteorder="little"))
         mani.write(MANI.checksum.to_bytes(4, byteorder="little", signed=True))
         
-        MANI.seq_offset = 20
+        MANI.dir_offset = mani.tell() + 12 # Main header end
+        MANI.seq_offset = MANI.dir_offset + 40 * len(anim_table) # Directory end
         
         mani.write(MANI.num_sequences.to_bytes(4, byteorder="little"))
         mani.write(MANI.seq_offset.to_bytes(4, byteorder="little"))
+        mani.write(MANI.dir_offset.to_bytes(4, byteorder="little"))
+        directory = reserve(mani, 40 * len(anim_table))
         
-        AnimSeqSection = io.BytesIO(b'')
+        entries = []
         for seq in anim_table:
-            AnimSeqSection.write(seq.index.to_bytes(4,byteorder="little"))
-            AnimSeqSection.write(''.join(seq.name).encode("utf-8"))
-            AnimSeqSection.write(seq.numFrames.to_bytes(4,byteorder="little"))
-            AnimSeqSection.write(seq.fps.to_bytes(1,byteorder="little"))
+            seq_start = mani.tell()
+            mani.write(seq.index.to_bytes(4,byteorder="little"))
+            mani.write(''.join(seq.name).encode("utf-8"))
+            mani.write(seq.numFrames.to_bytes(4,byteorder="little"))
+            mani.write(seq.fps.to_bytes(1,byteorder="little"))
+            
+            quantized = seq.encoding == MANIENCODING.QUANTIZED
+            ranges = b""
+            if quantized:
+                ranges = np.zeros((2, len(seq.ranges["pos_min"][0])), dtype=mchanrange_st)
+                ranges["pos_min"] = seq.ranges["pos_min"]
+                ranges["pos_step"] = seq.ranges["pos_step"]
+                ranges["rot_min"] = seq.ranges["rot_min"]
+                ranges["rot_step"] = seq.ranges["rot_step"]
+                ranges = ranges.tobytes()
             
-            AnimDataSection = io.BytesIO(b'')
+            snapshots = [i for i, dat in enumerate(seq.frames) if dat.flags & MFRAMEFLAGS.SNAPSHOT]
+            mani.write(seq.snapshot_interval.to_bytes(4,byteorder="little"))
+            mani.write(len(snapshots).to_bytes(4,byteorder="little"))
+            mani.write(seq.encoding.to_bytes(1,byteorder="little"))
+            mani.write(seq.bits.to_bytes(1,byteorder="little"))
+            mani.write((len(ranges) // mchanrange_st.itemsize).to_bytes(4,byteorder="little"))
+            mani.write(seq.bone_count.to_bytes(4,byteorder="little"))
+            mani.write(np.array(snapshots, dtype="<i4").tobytes())
+            frame_offsets = reserve(mani, 4 * len(seq.frames))
+            mani.write(ranges)
+            
+            offsets = []
             for dat in seq.frames:
-                AnimDataSection.write(dat.frame.to_bytes(2,byteorder="little"))
-                for bone in dat.bone:
-                    if bone.flags == 0:
-                        continue
-                    AnimDataSection.write(bone.flags.to_bytes(1,byteorder="little"))
-                    AnimDataSection.write(bone.boneIndex.to_bytes(1,byteorder="little"))
-                    if (bone.flags & 0x1) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.posX))[0].to_bytes(2,byteorder="little"))
-                    if (bone.flags & 0x2) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.posY))[0].to_bytes(2,byteorder="little"))
-                    if (bone.flags & 0x4) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.posZ))[0].to_bytes(2,byteorder="little"))
-                    if (bone.flags & 0x8) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.rotX))[0].to_bytes(2,byteorder="little"))
-                    if (bone.flags & 0x10) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.rotY))[0].to_bytes(2,byteorder="little"))
-                    if (bone.flags & 0x20) != 0:
-                        AnimDataSection.write(struct.unpack('H', struct.pack('e', bone.rotZ))[0].to_bytes(2,byteorder="little"))
-            AnimSeqSection.write(AnimDataSection.getvalue())
-        mani.write(AnimSeqSection.getvalue())
-        with open(filepath+"mani", "wb") as f:
-            f.write(mani.getbuffer())
+                offsets.append(mani.tell())
+                records = dat.bone.changed()
+                mask = np.zeros(seq.bone_count, dtype=bool)
+                mask[records.boneIndex] = True
+                mani.write(dat.frame.to_bytes(2,byteorder="little",signed=True))
+                mani.write(dat.flags.to_bytes(1,byteorder="little"))
+                mani.write(len(records).to_bytes(2,byteorder="little"))
+                mani.write(np.packbits(mask, bitorder="little").tobytes())
+                mani.write(records.tobytes(seq.encoding, seq.bits))
+            patch(mani, frame_offsets, np.array(offsets, dtype="<i4").tobytes())
+            entries.append(seq_start.to_bytes(4,byteorder="little") + (mani.tell() - seq_start).to_bytes(4,byteorder="little") + ''.join(seq.name).encode("utf-8"))
+        patch(mani, directory, b"".join(entries))
 
 from bpy_extras.io_utils import ExportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, FloatProperty
 from bpy.types import Operator
 
 class ExportMADL(Operator, ExportHelper):
@@ -793,6 +1561,88 @@ class ExportMADL(Operator, ExportHelper):
         default='',
     )
     
+    phy_hull: BoolProperty(
+        name="Convex hulls",
+        description="Reduce every physics part to its convex hull.",
+        default=True,
+    )
+    
+    phy_max_vertices: IntProperty(
+        name="Max hull vertices",
+        description="Vertex limit for one physics hull, 0 = no limit",
+        default=64,
+        min=0,
+        max=65535,
+    )
+    
+    phy_weld: FloatProperty(
+        name="Weld distance",
+        description="Physics vertices closer than this are merged before building the hull",
+        default=0.001,
+        min=0.0,
+        precision=4,
+    )
+    
+    anim_tolerance: FloatProperty(
+        name="Keyframe tolerance",
+        description="Frames that linear interpolation between kept frames reproduces within this distance (and radians) are dropped, 0 = keep every frame",
+        default=0.0005,
+        min=0.0,
+        precision=5,
+    )
+    
+    anim_snapshot_interval: IntProperty(
+        name="Snapshot interval",
+        description="Store a full pose every this many frames so players can seek without replaying the sequence, 0 = only the first frame",
+        default=30,
+        min=0,
+    )
+    
+    anim_encoding: EnumProperty(
+        name="Channel encoding",
+        description="How bone deltas are stored",
+        items=(
+            ('HALF', "Half float", "16 bit floats, euler rotation deltas"),
+            ('QUANTIZED', "Quantized", "Fixed point scaled to each bone's range in the sequence, smallest-three quaternion rotations"),
+        ),
+        default='HALF',
+    )
+    
+    anim_bits: IntProperty(
+        name="Bits per channel",
+        description="Precision of quantized channels, 8 bit values take one byte, 9 to 16 bit values two",
+        default=16,
+        min=8,
+        max=16,
+    )
+    
+    vtf_workers: IntProperty(
+        name="VTFCMD processes",
+        description="How many VTFCMD conversions may run at once, 0 = one per CPU core",
+        default=0,
+        min=0,
+    )
+    
+    vtf_timeout: IntProperty(
+        name="VTFCMD timeout",
+        description="Seconds one conversion may take before the export fails, 0 = no limit",
+        default=120,
+        min=0,
+    )
+    
+    use_texture_cache: BoolProperty(
+        name="Cache textures",
+        description="Reuse encoded textures from earlier exports if the image did not change.",
+        default=True,
+    )
+    
+    texture_cache_path: StringProperty(
+        name="Cache path",
+        description="Texture cache directory, empty for the default user cache directory",
+        default='',
+        subtype='DIR_PATH',
+    )
+    
     def draw(self, context):
         layout = self.layout
         layout.prop(self, "add_tex")
@@ -802,12 +1652,34 @@ class ExportMADL(Operator, ExportHelper):
         column.prop(self, "tex_type")
         if self.tex_type == "VTF":
             column.prop(self, "vtfcmd_path")
+            column.prop(self, "vtf_workers")
+            column.prop(self, "vtf_timeout")
+        column.prop(self, "use_texture_cache")
+        if self.use_texture_cache:
+            column.prop(self, "texture_cache_path")
 
         layout.prop(self, "add_phy")
+        column = layout.column()
+        column.enabled = self.add_phy
+        column.prop(self, "phy_hull")
+        if self.phy_hull:
+            column.prop(self, "phy_max_vertices")
+            column.prop(self, "phy_weld")
+
         layout.prop(self, "add_anim")
+        column = layout.column()
+        column.enabled = self.add_anim
+        column.prop(self, "anim_tolerance")
+        column.prop(self, "anim_snapshot_interval")
+        column.prop(self, "anim_encoding")
+        if self.anim_encoding == 'QUANTIZED':
+            column.prop(self, "anim_bits")
 
     def execute(self, context):
-        return main(self,context, self.filepath, self.add_tex, self.add_phy, self.add_anim, self.tex_type, self.vtfcmd_path)
+        texture_cache_path = self.use_texture_cache and (bpy.path.abspath(self.texture_cache_path) or default_texture_cache_path()) or None
+        return main(self,context, self.filepath, self.add_tex, self.add_phy, self.add_anim, self.tex_type, self.vtfcmd_path, texture_cache_path, self.vtf_workers, self.vtf_timeout,
+            self.phy_hull, self.phy_max_vertices, self.phy_weld, self.anim_tolerance, self.anim_snapshot_interval,
+            self.anim_encoding, self.anim_bits)
 
 def menu_func_export(self, context):
     self.layout.operator(ExportMADL.bl_idname, text="MADL (.madl)")
@@ -821,144 +1693,61 @@ def unregister():
     bpy.utils.unregister_class(ExportMADL)
     bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
 
+class CommandLineReport:
+    # Stands in for the operator in main() when exporting without UI
+    def __init__(self):
+        self.errors = []
 
-if __name__ == "__main__":
-    register()
+    def report(self, level, message):
+        print(f"{'/'.join(sorted(level))}: {message}")
+        if 'ERROR' in level:
+            self.errors.append(message)
 
-""" Types, see https://github.com/Spalishe/MADL/blob/main/MADL specification.txt"""
+def export_from_command_line(argv):
+    # blender --background rig.blend --python RigToMADL_v2.py -- --rig NAME --output out.madl [options]
+    import argparse
+    parser = argparse.ArgumentParser(prog="RigToMADL_v2.py", description="Export one rig from the opened .blend file.")
+    parser.add_argument("--rig", required=True, help="Armature object name")
+    parser.add_argument("--output", required=True, help="Output .madl path, MTEX/MPHY/MANI are written next to it")
+    parser.add_argument("--no-tex", dest="add_tex", action="store_false", help="Do not create MTEX file")
+    parser.add_argument("--phy", dest="add_phy", action="store_true", help="Create MPHY file")
+    parser.add_argument("--no-phy-hull", dest="phy_hull", action="store_false", help="Keep physics vertices as they are")
+    parser.add_argument("--phy-max-vertices", type=int, default=64, help="Vertex limit for one physics hull, 0 = no limit")
+    parser.add_argument("--phy-weld", type=float, default=0.001, help="Weld distance for physics vertices")
+    parser.add_argument("--anim", dest="add_anim", action="store_true", help="Create MANI file")
+    parser.add_argument("--anim-tolerance", type=float, default=0.0005, help="Keyframe reduction tolerance, 0 = keep every frame")
+    parser.add_argument("--anim-snapshot-interval", type=int, default=30, help="Frames between full pose snapshots, 0 = only the first frame")
+    parser.add_argument("--anim-encoding", default="HALF", choices=("HALF", "QUANTIZED"))
+    parser.add_argument("--anim-bits", type=int, default=16, choices=range(8, 17), metavar="8-16", help="Bits per quantized channel")
+    parser.add_argument("--tex-type", default="PNG", choices=("PNG", "JPEG", "VTF"))
+    parser.add_argument("--vtfcmd", default="", help="Path to VTFCMD")
+    parser.add_argument("--vtf-workers", type=int, default=0)
+    parser.add_argument("--vtf-timeout", type=int, default=120)
+    parser.add_argument("--texture-cache", default=None, help="Texture cache directory")
+    parser.add_argument("--no-texture-cache", action="store_true")
+    args = parser.parse_args(argv)
 
-#MADL
-class madl_st:
-    id = 1279541581
-    version = 1
-    checksum = 0
-    name = []
-    
-    bone_count = 0
-    bone_offset = 0
-    
-    static_mesh_count = 0
-    static_mesh_offset = 0
-    
-    dvertx_count = 0
-    dvertx_offset = 0
-    
-class mbone_st:
-    index = 0
-    name = []
-    parent = 0
-    bone_position = mathutils.Vector((0.0, 0.0, 0.0))
-    bone_angle = mathutils.Quaternion((0.0, 0.0, 0.0, 0.0))
-    
-class mstmesh_st:
-    struct_size = 0
-    index = 0
-    name = []
-    parented = 0 # 0 - False, >0 - True
-    boneIndex = 0
-    position = mathutils.Vector((0.0,0.0,0.0))
-    angle = mathutils.Euler((0.0, 0.0, 0.0),'XYZ')
-    vertices_count = 0
-    vertices = []
-    texture = 0
-    
-class m_stvert_st:
-    vert_position = mathutils.Vector((0.0,0.0,0.0))
-    vert_normal = mathutils.Vector((0.0,0.0,0.0))
-    vert_texcoord = mathutils.Vector((0.0,0.0,0.0)) # third axis ignored
-    
-class mdynvert_st:
-    struct_size = 0
-    numbones = 0
-    weight = []
-    bone = []
-    vert_position = mathutils.Vector((0.0,0.0,0.0))
-    vert_normal = mathutils.Vector((0.0,0.0,0.0))
-    vert_texcoord = mathutils.Vector((0.0,0.0,0.0)) # third axis ignored
-
-class mdynmesh_st:
-    struct_size = 0
-    index = 0
-    name = []
-    vertices_count = 0
-    vertices = []
-    texture = 0
-
-#MTEX
-class mtex_st:
-    id = 1480938573
-    version = 1
-    checksum = 0
-    
-    tex_count = 0
-    tex_offset = 0
-
-class mtexdata_st:
-    struct_size = 0
-    texture = 0
-    name = []
-    data_length = 0
-    data = []
-    emission = 0
-    emission_data_length = 0
-    emission_data = []
-
-#MPHY
-class mphy_st:
-    id = 1497911373
-    version = 1
-    checksum = 0
-    
-    phy_count = 0
-    phy_offset = 0
-    
-class mphysdata_st:
-    struct_size = 0
-    index = 0
-    name = []
-    parented = 0
-    boneIndex = 0
-    position = mathutils.Vector((0.0, 0.0, 0.0))
-    angle = mathutils.Euler((0.0, 0.0, 0.0),'XYZ')
-    vertices_count = 0
-    vertices = []
-    
-#MANI
-class mani_st:
-    id = 1229865293
-    version = 1
-    checksum = 0
-    
-    num_sequences = 0
-    seq_offset = 0
-    
-class manimseq_st:
-    index = 0
-    name = []
-    numFrames = 0
-    fps = 24 # got real
-    
-    frames = []
-    
-class manimdata_st:
-    frame = 0
-    bone = []
-    
-class mbonepos_t:
-    flags = 0x0
-    boneIndex = 0
-    posX = 0
-    posY = 0
-    posZ = 0
-    rotX = 0
-    rotY = 0
-    rotZ = 0
-
-class MBONEFLAGS:
-    NOCHANGES = 0x0
-    POSX = 0x1
-    POSY = 0x2
-    POSZ = 0x4
-    ROTX = 0x8
-    ROTY = 0x10
-    ROTZ = 0x20
\ No newline at end of file
+    rig = bpy.data.objects.get(args.rig)
+    if rig == None or rig.type != 'ARMATURE':
+        print(f"ERROR: no armature named {args.rig!r}")
+        return 1
+    for obj in bpy.context.view_layer.objects:
+        obj.select_set(obj == rig)
+    bpy.context.view_layer.objects.active = rig
+
+    output = os.path.abspath(args.output)
+    if not output.lower().endswith(".madl"):
+        output = output + ".madl"
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    texture_cache_path = not args.no_texture_cache and (args.texture_cache or default_texture_cache_path()) or None
+
+    reporter = CommandLineReport()
+    result = main(reporter, bpy.context, output, args.add_tex, args.add_phy, args.add_anim, args.tex_type,
+        args.vtfcmd, texture_cache_path, args.vtf_workers, args.vtf_timeout, args.phy_hull, args.phy_max_vertices, args.phy_weld,
+        args.anim_tolerance, args.anim_snapshot_interval, args.anim_encoding, args.anim_bits)
+    return 0 if 'FINISHED' in result and not reporter.errors else 1
+
+if __name__ == "__main__":
+    register()
+    if bpy.app.background and "--" in sys.argv:
+        sys.exit(export_from_command_line(sys.argv[sys.argv.index("--") + 1:]))
@@ -0,0 +1,27 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+# Standalone (no bpy) reader for MADL, MTEX, MPHY and MANI files, plus pose evaluation and skinning.
+
+from .structs import MADL_ID, MTEX_ID, MPHY_ID, MANI_ID, MBVH_ID, MBONEFLAGS, MFRAMEFLAGS, MANIENCODING
+from .reader import (
+    MappedFile,
+    MADLFile,
+    MTEXFile,
+    MPHYFile,
+    MANIFile,
+    Model,
+    StaticMesh,
+    DynamicMesh,
+    Texture,
+    PhysicsMesh,
+    AnimSequence,
+    AnimFrame,
+    open_madl,
+    open_mtex,
+    open_mphy,
+    open_mani,
+    open_model,
+)
+from .model import StaticVertices, DynamicVertices, BoneChannels
+from .pose import Skeleton, Clip, PoseEvaluator
+from .skinning import SkinnedMesh, skin_meshes
+from . import skinning
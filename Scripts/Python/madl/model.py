@@ -0,0 +1,339 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+"""
+In-memory model shared by the exporter (Scripts/Blender/RigToMADL_v2.py) and the reader.
+
+Headers are __slots__ records, every instance gets its own copy of the defaults. Vertices and animation
+channels are column stores, one NumPy array per field, turned into their binary layout in one go
+instead of one Python object per vertex or bone.
+"""
+
+import numpy as np
+
+from . import structs
+
+class Record:
+    __slots__ = ()
+    fields = {} # name -> default, callables (list) are called per instance
+
+    def __init__(self, **values):
+        for name, default in self.fields.items():
+            setattr(self, name, default() if callable(default) else default)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)})"
+
+#MADL
+class madl_st(Record):
+    fields = {
+        "id": 1279541581,
+        "version": 2,
+        "checksum": 0,
+        "name": list,
+        "bone_count": 0,
+        "bone_offset": 0,
+        "static_mesh_count": 0,
+        "static_mesh_offset": 0,
+        "dvertx_count": 0,
+        "dvertx_offset": 0,
+    }
+    __slots__ = tuple(fields)
+
+class mbone_st(Record):
+    fields = {
+        "index": 0,
+        "name": list,
+        "parent": 0,
+        "bone_position": (0.0, 0.0, 0.0),
+        "bone_angle": (0.0, 0.0, 0.0, 0.0),
+    }
+    __slots__ = tuple(fields)
+
+class mstmesh_st(Record):
+    fields = {
+        "struct_size": 0,
+        "index": 0,
+        "name": list,
+        "parented": 0, # 0 - False, >0 - True
+        "boneIndex": 0,
+        "position": (0.0, 0.0, 0.0),
+        "angle": (0.0, 0.0, 0.0),
+        "vertices_count": 0,
+        "vertices": None, # StaticVertices
+        "indices": list, # v2+, triangle list into vertices
+        "texture": 0,
+    }
+    __slots__ = tuple(fields)
+
+class mdynmesh_st(Record):
+    fields = {
+        "struct_size": 0,
+        "index": 0,
+        "name": list,
+        "vertices_count": 0,
+        "vertices": None, # DynamicVertices
+        "indices": list, # v2+, triangle list into vertices
+        "texture": 0,
+    }
+    __slots__ = tuple(fields)
+
+class StaticVertices:
+    """ m_stvert_st columns. """
+    __slots__ = ("vert_position", "vert_normal", "vert_texcoord")
+
+    def __init__(self, vert_position, vert_normal, vert_texcoord):
+        self.vert_position = np.asarray(vert_position, dtype=np.float32).reshape(-1, 3)
+        self.vert_normal = np.asarray(vert_normal, dtype=np.float32).reshape(-1, 3)
+        self.vert_texcoord = np.asarray(vert_texcoord, dtype=np.float32).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.vert_position)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    @classmethod
+    def from_array(cls, vertices):
+        # m_stvert_st structured array, for example a reader view into the file
+        return cls(vertices["vert_position"], vertices["vert_normal"], vertices["vert_texcoord"])
+
+    @property
+    def nbytes(self):
+        return len(self) * structs.m_stvert_st.itemsize
+
+    def to_array(self):
+        vertices = np.empty(len(self), dtype=structs.m_stvert_st)
+        vertices["vert_position"] = self.vert_position
+        vertices["vert_normal"] = self.vert_normal
+        vertices["vert_texcoord"] = self.vert_texcoord
+        return vertices
+
+    def tobytes(self):
+        return self.to_array().tobytes()
+
+class DynamicVertices:
+    """
+    mdynvert_st columns. weight and bone are padded to the largest numbones,
+    padding weight is 0 and padding bone is -1.
+    """
+    __slots__ = ("numbones", "weight", "bone", "vert_position", "vert_normal", "vert_texcoord")
+
+    def __init__(self, numbones, weight, bone, vert_position, vert_normal, vert_texcoord):
+        self.numbones = np.asarray(numbones, dtype=np.uint8).reshape(-1)
+        count = len(self.numbones)
+        self.weight = np.asarray(weight, dtype=np.float32).reshape(count, -1)
+        self.bone = np.asarray(bone, dtype=np.int32).reshape(count, -1)
+        self.vert_position = np.asarray(vert_position, dtype=np.float32).reshape(-1, 3)
+        self.vert_normal = np.asarray(vert_normal, dtype=np.float32).reshape(-1, 3)
+        self.vert_texcoord = np.asarray(vert_texcoord, dtype=np.float32).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.numbones)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    @property
+    def sizes(self):
+        # Bytes of every vertex, struct_size included
+        counts, inverse = np.unique(self.numbones, return_inverse=True)
+        return np.array([structs.mdynvert_st(int(n)).itemsize for n in counts], dtype=np.int64)[inverse.reshape(-1)]
+
+    @property
+    def nbytes(self):
+        return int(self.sizes.sum())
+
+    def tobytes(self):
+        sizes = self.sizes
+        starts = np.cumsum(sizes) - sizes
+        out = np.zeros(int(sizes.sum()), dtype=np.uint8)
+        for n in np.unique(self.numbones):
+            n = int(n)
+            rows = np.nonzero(self.numbones == n)[0]
+            records = np.zeros(len(rows), dtype=structs.mdynvert_st(n))
+            records["struct_size"] = records.dtype.itemsize - records.dtype["struct_size"].itemsize
+            records["numbones"] = n
+            records["weight"] = self.weight[rows, :n]
+            records["bone"] = self.bone[rows, :n]
+            records["vert_position"] = self.vert_position[rows]
+            records["vert_normal"] = self.vert_normal[rows]
+            records["vert_texcoord"] = self.vert_texcoord[rows]
+            out[starts[rows, None] + np.arange(records.dtype.itemsize)] = records.view(np.uint8).reshape(len(rows), -1)
+        return out.tobytes()
+
+    @classmethod
+    def from_buffer(cls, buffer, offsets, numbones):
+        # Gather variable sized mdynvert_st records starting at offsets, one vectorized read per numbones
+        count = len(offsets)
+        width = int(numbones.max()) if count else 0
+        weight = np.zeros((count, width), dtype=np.float32)
+        bone = np.full((count, width), -1, dtype=np.int32)
+        position = np.empty((count, 3), dtype=np.float32)
+        normal = np.empty((count, 3), dtype=np.float32)
+        texcoord = np.empty((count, 2), dtype=np.float32)
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        for n in np.unique(numbones):
+            n = int(n)
+            dtype = structs.mdynvert_st(n)
+            rows = np.nonzero(numbones == n)[0]
+            gathered = raw[offsets[rows, None] + np.arange(dtype.itemsize)].view(dtype).reshape(-1)
+            if n:
+                weight[rows, :n] = gathered["weight"].reshape(-1, n)
+                bone[rows, :n] = gathered["bone"].reshape(-1, n)
+            position[rows] = gathered["vert_position"]
+            normal[rows] = gathered["vert_normal"]
+            texcoord[rows] = gathered["vert_texcoord"]
+        return cls(numbones, weight, bone, position, normal, texcoord)
+
+#MTEX
+class mtex_st(Record):
+    fields = {
+        "id": 1480938573,
+        "version": 2,
+        "checksum": 0,
+        "tex_count": 0,
+        "tex_offset": 0,
+    }
+    __slots__ = tuple(fields)
+
+class mtexdata_st(Record):
+    fields = {
+        "struct_size": 0,
+        "texture": 0,
+        "name": list,
+        "data_length": 0,
+        "data": b"", # bytes-like, raw image file
+        "emission": 0,
+        "emission_data_length": 0,
+        "emission_data": b"",
+    }
+    __slots__ = tuple(fields)
+
+#MPHY
+class mphy_st(Record):
+    fields = {
+        "id": 1497911373,
+        "version": 2,
+        "checksum": 0,
+        "phy_count": 0,
+        "phy_offset": 0,
+        "bvh": None, # build_bvh() result, written as the trailing mphybounds_st
+    }
+    __slots__ = tuple(fields)
+
+class mphysdata_st(Record):
+    fields = {
+        "struct_size": 0,
+        "index": 0,
+        "name": list,
+        "parented": 0,
+        "boneIndex": 0,
+        "position": (0.0, 0.0, 0.0),
+        "angle": (0.0, 0.0, 0.0),
+        "vertices_count": 0,
+        "vertices": list,
+        "faces": list, # triangles, counter-clockwise seen from outside
+        # mphybound_st, bone-local
+        "mins": (0.0, 0.0, 0.0),
+        "maxs": (0.0, 0.0, 0.0),
+        "center": (0.0, 0.0, 0.0),
+        "radius": 0.0,
+        # Rest pose AABB, only used to build the BVH
+        "rest_mins": None,
+        "rest_maxs": None,
+    }
+    __slots__ = tuple(fields)
+
+#MANI
+class mani_st(Record):
+    fields = {
+        "id": 1229865293,
+        "version": 2,
+        "checksum": 0,
+        "num_sequences": 0,
+        "seq_offset": 0,
+        "dir_offset": 0, # v2+, mseqdir_st table, one per sequence
+    }
+    __slots__ = tuple(fields)
+
+class manimseq_st(Record):
+    fields = {
+        "index": 0,
+        "name": list,
+        "numFrames": 0,
+        "fps": 24, # got real
+        "snapshot_interval": 0, # v2+, frames between snapshots, 0 = only the first frame
+        "encoding": 0, # v2+, MANIENCODING
+        "bits": 16, # v2+, bits per quantized value
+        "ranges": None, # v2+, quantize_sequence() output, mchanrange_st tables
+        "bone_count": 0, # v2+, bits in every frame's boneMask
+        "frames": list,
+    }
+    __slots__ = tuple(fields)
+
+class manimdata_st(Record):
+    fields = {
+        "frame": 0,
+        "flags": 0x0, # v2+, MFRAMEFLAGS
+        "bone": None, # BoneChannels
+    }
+    __slots__ = tuple(fields)
+
+class BoneChannels:
+    """
+    mbonepos_t records of one frame as columns. HALF: pos/rot are float deltas, rot as euler.
+    QUANTIZED: pos/rot are the fixed point values, rot the smallest-three quaternion with rotLargest.
+    """
+    __slots__ = ("flags", "boneIndex", "pos", "rot", "rotLargest")
+
+    def __init__(self, flags, boneIndex, pos, rot, rotLargest=None):
+        self.flags = np.asarray(flags, dtype=np.uint8).reshape(-1)
+        boneIndex = np.asarray(boneIndex).reshape(-1)
+        if len(boneIndex) and (boneIndex.min() < 0 or boneIndex.max() > np.iinfo(np.uint16).max):
+            raise ValueError(f"bone index {int(boneIndex.max())} does not fit the ushort mbonepos_t.boneIndex.")
+        self.boneIndex = boneIndex.astype(np.uint16)
+        self.pos = np.asarray(pos).reshape(-1, 3)
+        self.rot = np.asarray(rot).reshape(-1, 3)
+        self.rotLargest = np.zeros(len(self.flags), dtype=np.uint8) if rotLargest is None else np.asarray(rotLargest, dtype=np.uint8).reshape(-1)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, rows):
+        return BoneChannels(self.flags[rows], self.boneIndex[rows], self.pos[rows], self.rot[rows], self.rotLargest[rows])
+
+    def changed(self):
+        # Only records with at least one channel, the rest are not written
+        return self[self.flags != 0]
+
+    def tobytes(self, encoding=structs.MANIENCODING.HALF, bits=16):
+        # Every record as a fixed width byte row plus a mask of the bytes actually written, flattened in one go
+        count = len(self)
+        header = np.empty(count, dtype=structs.mbonepos_head_st)
+        header["flags"] = self.flags
+        header["boneIndex"] = self.boneIndex
+        header = header.view(np.uint8).reshape(count, -1)
+        channel = (self.flags[:, None] >> np.arange(6)) & 1 != 0
+        if encoding == structs.MANIENCODING.QUANTIZED:
+            value_st = "u1" if bits <= 8 else "<u2"
+            size = np.dtype(value_st).itemsize
+            rotated = (self.flags & 0x38) != 0
+            rows = np.concatenate([
+                header,
+                np.ascontiguousarray(self.pos, dtype=value_st).view(np.uint8).reshape(count, -1),
+                self.rotLargest[:, None],
+                np.ascontiguousarray(self.rot, dtype=value_st).view(np.uint8).reshape(count, -1),
+            ], axis=1)
+            mask = np.concatenate([
+                np.ones(header.shape, dtype=bool),
+                np.repeat(channel[:, :3], size, axis=1),
+                rotated[:, None],
+                np.repeat(rotated[:, None], 3 * size, axis=1),
+            ], axis=1)
+        else:
+            values = np.concatenate([self.pos, self.rot], axis=1)
+            rows = np.concatenate([header, np.ascontiguousarray(values, dtype="<f2").view(np.uint8).reshape(count, -1)], axis=1)
+            mask = np.concatenate([np.ones(header.shape, dtype=bool), np.repeat(channel, 2, axis=1)], axis=1)
+        return rows[mask].tobytes()
@@ -0,0 +1,218 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+"""
+Pose evaluation: armature space bone matrices from a MADL skeleton and a MANI sequence.
+
+MANI deltas are per bone in armature space (the exporter samples PoseBone.head and PoseBone.matrix),
+so a decoded frame already is a full pose. The bone hierarchy is only needed for the rest pose, which
+MADL stores relative to the parent: bone_position as a difference of heads, bone_angle as a component-wise
+difference of quaternions. Both add up along the parent chain.
+
+Vertex spaces (v2): dynamic mesh vertices are in armature space, static mesh vertices in the rest space of
+their bone, so Skeleton.rest_matrices[boneIndex] @ vertex is the armature space rest position and
+matrices()[..., boneIndex, :, :] @ vertex the posed one.
+"""
+
+import numpy as np
+
+from . import structs
+from .quat import quaternion_multiply, quaternion_to_matrix, quaternion_slerp
+from .reader import MADLFile, _name
+
+def compose(positions, rotations):
+    # (...,3) and (...,4) -> (...,4,4) rigid transforms
+    matrices = np.zeros(positions.shape[:-1] + (4, 4))
+    matrices[..., :3, :3] = quaternion_to_matrix(rotations)
+    matrices[..., :3, 3] = positions
+    matrices[..., 3, 3] = 1
+    return matrices
+
+class Skeleton:
+    """
+    Rest pose of a MADL bone table (mbone_st array or MADLFile), computed once.
+    order lists bone indices with every parent before its children.
+    """
+    def __init__(self, bones):
+        if isinstance(bones, MADLFile):
+            bones = bones.bones
+        self.names = [_name(bone) for bone in bones]
+        self.parents = np.array([int(bone["parent"]) for bone in bones], dtype=np.int64)
+        self.order = self._topological_order(self.parents)
+
+        local_positions = np.array(bones["bone_position"], dtype=np.float64).reshape(-1, 3)
+        local_angles = np.array(bones["bone_angle"], dtype=np.float64).reshape(-1, 4)
+        self.rest_positions = np.zeros_like(local_positions)
+        self.rest_rotations = np.zeros_like(local_angles)
+        for bone in self.order:
+            parent = self.parents[bone]
+            if parent < 0:
+                self.rest_positions[bone] = local_positions[bone]
+                self.rest_rotations[bone] = local_angles[bone]
+            else:
+                self.rest_positions[bone] = self.rest_positions[parent] + local_positions[bone]
+                self.rest_rotations[bone] = self.rest_rotations[parent] + local_angles[bone]
+        self.rest_rotations /= np.linalg.norm(self.rest_rotations, axis=-1, keepdims=True)
+        self.rest_matrices = compose(self.rest_positions, self.rest_rotations)
+        self.inverse_rest_matrices = np.linalg.inv(self.rest_matrices)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def index(self, name):
+        return self.names.index(name)
+
+    @staticmethod
+    def _topological_order(parents):
+        count = len(parents)
+        children = [[] for _ in range(count)]
+        roots = []
+        for bone, parent in enumerate(parents):
+            if parent < 0:
+                roots.append(bone)
+            elif parent >= count:
+                raise ValueError(f"bone {bone} has parent {parent}, there are only {count} bones.")
+            else:
+                children[parent].append(bone)
+        order = []
+        stack = roots[::-1]
+        while stack:
+            bone = stack.pop()
+            order.append(bone)
+            stack.extend(children[bone][::-1])
+        if len(order) != count:
+            raise ValueError("bone parents form a cycle.")
+        return np.array(order, dtype=np.int64)
+
+class Clip:
+    """
+    One MANI sequence decoded to absolute armature space poses at its stored frames.
+    Any frame or time in between is interpolated like the exporter assumed when it dropped frames:
+    linear for positions, slerp for rotations.
+    """
+    def __init__(self, skeleton, sequence):
+        self.skeleton = skeleton
+        self.name = sequence.name
+        self.fps = sequence.fps
+
+        count = len(sequence)
+        bones = len(skeleton)
+        self.key_frames = np.zeros(count, dtype=np.float64)
+        self.key_positions = np.zeros((count, bones, 3))
+        self.key_rotations = np.zeros((count, bones, 4))
+        positions = skeleton.rest_positions.copy()
+        rotations = skeleton.rest_rotations.copy()
+        for i in range(count):
+            frame = sequence.frame(i)
+            # The first frame and snapshots are against the rest pose, everything else against the previous frame
+            if i == 0 or frame.flags & structs.MFRAMEFLAGS.SNAPSHOT:
+                positions = skeleton.rest_positions.copy()
+                rotations = skeleton.rest_rotations.copy()
+            base_rotations = rotations.copy()
+            records = frame.bones
+            if len(records) > 0:
+                index = records["boneIndex"].astype(np.int64)
+                flags = records["flags"].astype(np.int64)
+                moved = (flags[:, None] >> np.arange(3)) & 1
+                positions[index] += moved * records["pos"]
+                turned = (flags & structs.MBONEFLAGS.ALL & ~0x7) != 0
+                step = quaternion_multiply(records["quat"].astype(np.float64), base_rotations[index])
+                step /= np.linalg.norm(step, axis=-1, keepdims=True)
+                rotations[index] = np.where(turned[:, None], step, base_rotations[index])
+            self.key_frames[i] = frame.frame
+            self.key_positions[i] = positions
+            self.key_rotations[i] = rotations
+
+    @property
+    def first_frame(self):
+        return self.key_frames[0] if len(self.key_frames) else 0.0
+
+    @property
+    def last_frame(self):
+        return self.key_frames[-1] if len(self.key_frames) else 0.0
+
+    @property
+    def duration(self):
+        return (self.last_frame - self.first_frame) / self.fps if self.fps else 0.0
+
+    def frame_at(self, seconds, loop=False):
+        """ Frame number for a time in seconds from the start of the clip. """
+        seconds = np.asarray(seconds, dtype=np.float64)
+        if loop and self.duration > 0:
+            seconds = np.mod(seconds, self.duration)
+        return self.first_frame + seconds * self.fps
+
+    def sample(self, frames):
+        """ (N, bones, 3) positions and (N, bones, 4) rotations for N frame numbers (fractional is fine). """
+        frames = np.atleast_1d(np.asarray(frames, dtype=np.float64))
+        if len(self.key_frames) == 0:
+            return (np.broadcast_to(self.skeleton.rest_positions, (len(frames),) + self.skeleton.rest_positions.shape).copy(),
+                    np.broadcast_to(self.skeleton.rest_rotations, (len(frames),) + self.skeleton.rest_rotations.shape).copy())
+        if len(self.key_frames) == 1:
+            return np.repeat(self.key_positions, len(frames), axis=0), np.repeat(self.key_rotations, len(frames), axis=0)
+        i = np.clip(np.searchsorted(self.key_frames, frames, side="right") - 1, 0, len(self.key_frames) - 2)
+        t = np.clip((frames - self.key_frames[i]) / (self.key_frames[i + 1] - self.key_frames[i]), 0.0, 1.0)[:, None, None]
+        positions = self.key_positions[i] + (self.key_positions[i + 1] - self.key_positions[i]) * t
+        rotations = quaternion_slerp(self.key_rotations[i], self.key_rotations[i + 1], t)
+        return positions, rotations
+
+    def matrices(self, frames, root=None):
+        """
+        (N, bones, 4, 4) armature space bone matrices for N frames, (bones, 4, 4) for a single frame.
+        root: optional (4, 4) or (N, 4, 4) object transform of every instance, for world space.
+        """
+        single = np.ndim(frames) == 0
+        matrices = compose(*self.sample(frames))
+        if root is not None:
+            root = np.asarray(root, dtype=np.float64)
+            matrices = (root[:, None] if root.ndim == 3 else root) @ matrices
+        return matrices[0] if single else matrices
+
+    def skinning_matrices(self, frames, root=None):
+        """ Same as matrices(), multiplied by the inverse rest pose: moves rest pose vertices to the pose. """
+        return self.matrices(frames, root) @ self.skeleton.inverse_rest_matrices
+
+    def matrices_at_time(self, seconds, loop=False, root=None):
+        return self.matrices(self.frame_at(seconds, loop), root)
+
+class PoseEvaluator:
+    """
+    Skeleton plus lazily decoded clips of a MANI file, for evaluating many instances at once:
+        evaluator = PoseEvaluator(model.madl, model.mani)
+        matrices = evaluator.matrices(["walk", "run", "walk"], [3.5, 10.0, 7.25])  # (3, bones, 4, 4)
+    """
+    def __init__(self, madl, mani):
+        self.skeleton = madl if isinstance(madl, Skeleton) else Skeleton(madl)
+        self.mani = mani
+        self.clips = {}
+
+    def clip(self, sequence):
+        key = sequence if isinstance(sequence, (int, str)) else sequence.name
+        if key not in self.clips:
+            self.clips[key] = Clip(self.skeleton, self.mani.sequence(key) if isinstance(key, (int, str)) else sequence)
+        return self.clips[key]
+
+    def matrices(self, sequences, frames, root=None, skinning=False):
+        """
+        (N, bones, 4, 4) for N instances, each with its own sequence (name or index) and frame.
+        Instances playing the same sequence are evaluated together.
+        """
+        frames = np.asarray(frames, dtype=np.float64)
+        if isinstance(sequences, (int, str)):
+            sequences = [sequences] * len(frames)
+        root = None if root is None else np.asarray(root, dtype=np.float64)
+        result = np.zeros((len(frames), len(self.skeleton), 4, 4))
+        groups = {}
+        for i, sequence in enumerate(sequences):
+            groups.setdefault(sequence, []).append(i)
+        for sequence, members in groups.items():
+            members = np.array(members, dtype=np.int64)
+            clip = self.clip(sequence)
+            member_root = None if root is None else (root[members] if root.ndim == 3 else root)
+            if skinning:
+                result[members] = clip.skinning_matrices(frames[members], member_root)
+            else:
+                result[members] = clip.matrices(frames[members], member_root)
+        return result
+
+    def skinning_matrices(self, sequences, frames, root=None):
+        return self.matrices(sequences, frames, root, skinning=True)
@@ -0,0 +1,104 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+"""
+Vectorized quaternion and euler helpers shared by the exporter, the reader and pose evaluation.
+Quaternions are (...,4) w,x,y,z, eulers (...,3) in XYZ order (the mathutils default).
+"""
+
+import numpy as np
+
+def quaternion_multiply(a, b):
+    # Hamilton product of (...,4) w,x,y,z quaternions
+    aw, ax, ay, az = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bw, bx, by, bz = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ], axis=-1)
+
+def quaternion_inverse(quat):
+    # Unit quaternions only
+    return quat * np.array([1.0, -1.0, -1.0, -1.0])
+
+def quaternion_angle(a, b):
+    return 2 * np.arccos(np.clip(np.abs((a * b).sum(axis=-1)), 0.0, 1.0))
+
+def quaternion_to_matrix(quat):
+    # (...,4) w,x,y,z -> (...,3,3), normalized first like Blender does
+    quat = quat / np.maximum(np.linalg.norm(quat, axis=-1, keepdims=True), 1e-12)
+    w, x, y, z = quat[..., 0], quat[..., 1], quat[..., 2], quat[..., 3]
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+        np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+        np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=-2)
+
+def matrix_to_quaternion(matrix):
+    # (...,3,3) or (...,4,4) -> (...,4) w,x,y,z with w >= 0, scale is removed first
+    m = np.asarray(matrix, dtype=np.float64)[..., :3, :3]
+    m = m / np.maximum(np.linalg.norm(m, axis=-2, keepdims=True), 1e-12)
+    trace = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # Shepperd: build from the largest of w, x, y, z to stay away from sqrt of ~0
+    candidates = np.stack([
+        np.stack([1 + trace, m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0], m[..., 1, 0] - m[..., 0, 1]], axis=-1),
+        np.stack([m[..., 2, 1] - m[..., 1, 2], 1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], m[..., 0, 1] + m[..., 1, 0], m[..., 0, 2] + m[..., 2, 0]], axis=-1),
+        np.stack([m[..., 0, 2] - m[..., 2, 0], m[..., 0, 1] + m[..., 1, 0], 1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2], m[..., 1, 2] + m[..., 2, 1]], axis=-1),
+        np.stack([m[..., 1, 0] - m[..., 0, 1], m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1], 1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2]], axis=-1),
+    ], axis=-2)
+    diagonal = np.stack([1 + trace, 1 + m[..., 0, 0] - m[..., 1, 1] - m[..., 2, 2], 1 - m[..., 0, 0] + m[..., 1, 1] - m[..., 2, 2], 1 - m[..., 0, 0] - m[..., 1, 1] + m[..., 2, 2]], axis=-1)
+    best = np.argmax(diagonal, axis=-1)
+    quat = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+    quat = quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+    return np.where(quat[..., :1] < 0, -quat, quat)
+
+def quaternion_slerp(a, b, t):
+    # (...,4) quaternions, t broadcast against them
+    dot = (a * b).sum(axis=-1, keepdims=True)
+    b = np.where(dot < 0, -b, b)
+    angle = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+    sin = np.sin(angle)
+    close = sin < 1e-6
+    safe_sin = np.where(close, 1.0, sin)
+    wa = np.where(close, 1 - t, np.sin((1 - t) * angle) / safe_sin)
+    wb = np.where(close, t, np.sin(t * angle) / safe_sin)
+    result = wa * a + wb * b
+    return result / np.linalg.norm(result, axis=-1, keepdims=True)
+
+def quaternion_to_euler(quat):
+    # (...,4) w,x,y,z -> (...,3) XYZ euler, same order as mathutils to_euler()
+    w, x, y, z = (np.asarray(quat, dtype=np.float64)[..., i] for i in range(4))
+    return np.stack([
+        np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y)),
+        np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0)),
+        np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)),
+    ], axis=-1)
+
+def euler_to_quaternion(euler):
+    # (...,3) XYZ euler -> (...,4) w,x,y,z
+    half = np.asarray(euler, dtype=np.float64) / 2
+    cx, cy, cz = np.cos(half[..., 0]), np.cos(half[..., 1]), np.cos(half[..., 2])
+    sx, sy, sz = np.sin(half[..., 0]), np.sin(half[..., 1]), np.sin(half[..., 2])
+    return np.stack([
+        cx * cy * cz + sx * sy * sz,
+        sx * cy * cz - cx * sy * sz,
+        cx * sy * cz + sx * cy * sz,
+        cx * cy * sz - sx * sy * cz,
+    ], axis=-1)
+
+def smallest_three(quat):
+    # (...,4) -> index of the largest component, the other three in cyclic order after it with the largest made positive
+    largest = np.argmax(np.abs(quat), axis=-1)
+    sign = np.where(np.take_along_axis(quat, largest[..., None], axis=-1) < 0, -1.0, 1.0)
+    slots = (largest[..., None] + np.arange(1, 4)) % 4
+    return largest, np.take_along_axis(quat * sign, slots, axis=-1)
+
+def from_smallest_three(largest, three):
+    # Inverse of smallest_three, the largest component is rebuilt from the unit norm
+    largest = np.asarray(largest)
+    three = np.asarray(three, dtype=np.float64)
+    quat = np.zeros(three.shape[:-1] + (4,))
+    np.put_along_axis(quat, (largest[..., None] + np.arange(1, 4)) % 4, three, axis=-1)
+    np.put_along_axis(quat, largest[..., None], np.sqrt(np.maximum(0.0, 1 - (three * three).sum(axis=-1)))[..., None], axis=-1)
+    return quat / np.linalg.norm(quat, axis=-1, keepdims=True)
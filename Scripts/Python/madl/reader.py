@@ -0,0 +1,617 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+import mmap
+import os
+
+import numpy as np
+
+from . import structs
+from .model import StaticVertices, DynamicVertices
+from .quat import euler_to_quaternion, quaternion_to_euler, from_smallest_three
+
+def _name(record):
+    return bytes(record["name"]).split(b"\x00")[0].decode("utf-8", "replace")
+
+class MappedFile:
+    """
+    Read-only memory mapped MADL family file.
+
+    Every array handed out by the reader is a view into the mapping, nothing is copied
+    until it is written to or converted. Drop those views before calling close(), otherwise
+    the mapping stays alive until they are garbage collected.
+    """
+    magic = None
+    header_st = None
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.buffer)
+        if self.size < self.header_st.itemsize:
+            raise ValueError(f"{path}: file is too small to be a {self.magic.decode()} file.")
+        self.header = self.record(self.header_st, 0)
+        if bytes(self.header["id"]) != self.magic:
+            raise ValueError(f"{path}: bad file id, expected {self.magic.decode()}.")
+
+    @property
+    def version(self):
+        return int(self.header["version"])
+
+    @property
+    def checksum(self):
+        return int(self.header["checksum"])
+
+    def array(self, dtype, count, offset):
+        return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+
+    def record(self, dtype, offset):
+        return self.array(dtype, 1, offset)[0]
+
+    def bytes(self, offset, length):
+        if offset + length > self.size:
+            raise ValueError(f"{self.path}: section at {offset} runs past end of file.")
+        return memoryview(self.buffer)[offset:offset + length]
+
+    def u8(self, offset):
+        return self.buffer[offset]
+
+    def i8(self, offset):
+        value = self.buffer[offset]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            # Views are still exported, the mapping goes away together with them.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+#MADL
+class StaticMesh:
+    def __init__(self, header, vertices, indices, texture):
+        self.header = header
+        self.name = _name(header)
+        self.vertices = vertices    # m_stvert_st view
+        self.indices = indices      # triangle list view (v2+), None for v1
+        self.texture = texture
+
+    @property
+    def positions(self):
+        return self.vertices["vert_position"]
+
+    @property
+    def normals(self):
+        return self.vertices["vert_normal"]
+
+    @property
+    def texcoords(self):
+        return self.vertices["vert_texcoord"]
+
+    def columns(self):
+        # StaticVertices over the same memory, the layout the exporter writes from
+        return StaticVertices.from_array(self.vertices)
+
+class DynamicMesh:
+    def __init__(self, file, offset, header):
+        self.file = file
+        self.offset = offset
+        self.header = header
+        self.name = _name(header)
+        self._vertex_offsets = None
+        self._indices = None
+        self._texture = None
+
+    @property
+    def vertex_offsets(self):
+        # mdynvert_st is variable sized, so this is the only walk over vertices.
+        if self._vertex_offsets is None:
+            count = int(self.header["vertices_count"])
+            offsets = np.empty(count, dtype=np.int64)
+            numbones = np.empty(count, dtype=np.uint8)
+            buf = self.file.buffer
+            off = self.offset + structs.mdynmesh_st.itemsize
+            for i in range(count):
+                n = buf[off + 4]
+                offsets[i] = off
+                numbones[i] = n
+                off += structs.mdynvert_st(int(n)).itemsize
+            self._vertex_offsets = (offsets, numbones)
+            self._indices, off = self.file.index_block(off)
+            self._texture = self.file.i8(off)
+            self._end = off + 1
+        return self._vertex_offsets
+
+    @property
+    def end(self):
+        if int(self.header["struct_size"]) > 0:
+            return self.offset + 4 + int(self.header["struct_size"])
+        # Files from older exporters left struct_size at 0.
+        self.vertex_offsets
+        return self._end
+
+    @property
+    def texture(self):
+        if self._texture is None:
+            self.vertex_offsets
+        return self._texture
+
+    @property
+    def indices(self):
+        self.vertex_offsets
+        return self._indices
+
+    @property
+    def vertices(self):
+        offsets, numbones = self.vertex_offsets
+        return [self.file.record(structs.mdynvert_st(int(n)), int(o)) for o, n in zip(offsets, numbones)]
+
+    def arrays(self):
+        """
+        Decode vertices into a DynamicVertices column store, weights and bones padded to the largest numbones
+        (padding weight is 0, padding bone is -1). Columns are also available as arrays["vert_position"] etc.
+        """
+        offsets, numbones = self.vertex_offsets
+        return DynamicVertices.from_buffer(self.file.buffer, offsets, numbones)
+
+class MADLFile(MappedFile):
+    magic = structs.MADL_ID
+    header_st = structs.madl_st
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.name = _name(self.header)
+        self.bones = self.array(structs.mbone_st, int(self.header["bone_count"]), int(self.header["bone_offset"]))
+
+        self.static_meshes = []
+        off = int(self.header["static_mesh_offset"])
+        for _ in range(int(self.header["static_mesh_count"])):
+            head = self.record(structs.mstmesh_st, off)
+            verts_off = off + structs.mstmesh_st.itemsize
+            count = int(head["vertices_count"])
+            vertices = self.array(structs.m_stvert_st, count, verts_off)
+            indices, tex_off = self.index_block(verts_off + count * structs.m_stvert_st.itemsize)
+            texture = self.i8(tex_off)
+            self.static_meshes.append(StaticMesh(head, vertices, indices, texture))
+            off += 4 + int(head["struct_size"])
+
+        self.dynamic_meshes = []
+        off = int(self.header["dynamic_mesh_offset"])
+        for _ in range(int(self.header["dynamic_mesh_count"])):
+            head = self.record(structs.mdynmesh_st, off)
+            mesh = DynamicMesh(self, off, head)
+            self.dynamic_meshes.append(mesh)
+            off = mesh.end
+
+    def index_block(self, offset):
+        # index_size, index_count, indices[index_count]; v1 files have no index block
+        if self.version < 2:
+            return None, offset
+        index_size = self.u8(offset)
+        if index_size not in (2, 4):
+            raise ValueError(f"{self.path}: bad index size {index_size} at {offset}.")
+        count = int(self.array("<i4", 1, offset + 1)[0])
+        indices = self.array(index_size == 2 and "<u2" or "<u4", count, offset + 5)
+        return indices, offset + 5 + count * index_size
+
+    @property
+    def bone_names(self):
+        return [_name(bone) for bone in self.bones]
+
+#MTEX
+class Texture:
+    def __init__(self, header, data, emission, emission_data):
+        self.header = header
+        self.name = _name(header)
+        self.texture = int(header["texture"])
+        self.data = data                    # memoryview
+        self.emission = emission
+        self.emission_data = emission_data  # memoryview, empty if emission disabled
+
+class MTEXFile(MappedFile):
+    magic = structs.MTEX_ID
+    header_st = structs.mtex_st
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.textures = []
+        off = int(self.header["tex_offset"])
+        for _ in range(int(self.header["tex_count"])):
+            head = self.record(structs.mtexdata_st, off)
+            data, emission_off = self.payload(off + structs.mtexdata_st.itemsize - 4)
+            emission = self.u8(emission_off)
+            emission_data, _ = self.payload(emission_off + 1)
+            self.textures.append(Texture(head, data, emission, emission_data))
+            off += 4 + int(head["struct_size"])
+
+    def payload(self, offset):
+        # int length, data[length]; v2+ negative length means int offset of identical data stored earlier
+        length = int(self.array("<i4", 1, offset)[0])
+        if length < 0:
+            if self.version < 2:
+                raise ValueError(f"{self.path}: negative data length at {offset}.")
+            shared = int(self.array("<i4", 1, offset + 4)[0])
+            return self.bytes(shared, -length), offset + 8
+        return self.bytes(offset + 4, length), offset + 4 + length
+
+#MPHY
+class PhysicsMesh:
+    def __init__(self, header, vertices, faces):
+        self.header = header
+        self.name = _name(header)
+        self.boneIndex = int(header["boneIndex"])
+        self.vertices = vertices    # (vertices_count, 3) float32 view
+        self.faces = faces          # (face_count, 3) uint16 view of hull triangles, None before v2
+        self.bounds = None          # mphybound_st record if the file has a bounds section
+
+class MPHYFile(MappedFile):
+    magic = structs.MPHY_ID
+    header_st = structs.mphy_st
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.meshes = []
+        off = int(self.header["phy_offset"])
+        for _ in range(int(self.header["phy_count"])):
+            head = self.record(structs.mphysdata_st, off)
+            count = int(head["vertices_count"])
+            vert_off = off + structs.mphysdata_st.itemsize
+            vertices = self.array("<f4", count * 3, vert_off).reshape(count, 3)
+            faces = None
+            if self.version >= 2:
+                face_off = vert_off + count * 12
+                face_count = int(self.array("<i4", 1, face_off)[0])
+                faces = self.array("<u2", face_count * 3, face_off + 4).reshape(face_count, 3)
+            self.meshes.append(PhysicsMesh(head, vertices, faces))
+            off += 4 + int(head["struct_size"])
+
+        # Optional mphybounds_st after the last mesh
+        self.bounds = None  # mphybound_st per mesh, bone-local
+        self.bvh = None     # mbvhnode_st nodes in rest pose armature space, root first
+        if off + 12 <= self.size and bytes(self.bytes(off, 4)) == structs.MBVH_ID:
+            count = int(self.array("<i4", 1, off + 8)[0])
+            self.bounds = self.array(structs.mphybound_st, count, off + 12)
+            off += 12 + self.bounds.nbytes
+            node_count = int(self.array("<i4", 1, off)[0])
+            self.bvh = self.array(structs.mbvhnode_st, node_count, off + 4)
+            for mesh, bound in zip(self.meshes, self.bounds):
+                mesh.bounds = bound
+
+    def _require_bvh(self):
+        if self.bvh is None:
+            raise ValueError(f"{self.path}: file has no bounds section, export it again to get one.")
+
+    def refit(self, bone_matrices):
+        """
+        BVH node boxes for a pose, without rebuilding the tree.
+        bone_matrices: (bone_count, 4, 4) armature space bone matrices, PoseEvaluator.matrices() of one instance
+        (without root) or Skeleton.rest_matrices. Physics vertices and bounds are in rest bone space, so the rest
+        pose matrices give back the stored BVH.
+        Returns node (mins, maxs), both (node_count, 3).
+        """
+        self._require_bvh()
+        matrices = np.asarray(bone_matrices, dtype=np.float64)[[mesh.boneIndex for mesh in self.meshes]]
+        center = np.einsum("nij,nj->ni", matrices[:, :3, :3], (self.bounds["mins"] + self.bounds["maxs"]) / 2) + matrices[:, :3, 3]
+        extent = np.einsum("nij,nj->ni", np.abs(matrices[:, :3, :3]), (self.bounds["maxs"] - self.bounds["mins"]) / 2)
+
+        nodes = self.bvh
+        mins = np.empty((len(nodes), 3))
+        maxs = np.empty((len(nodes), 3))
+        leaves = nodes["phy"] >= 0
+        mins[leaves] = (center - extent)[nodes["phy"][leaves]]
+        maxs[leaves] = (center + extent)[nodes["phy"][leaves]]
+        # Children always come after their parent
+        for node in np.nonzero(~leaves)[0][::-1]:
+            left, right = nodes["left"][node], nodes["right"][node]
+            mins[node] = np.minimum(mins[left], mins[right])
+            maxs[node] = np.maximum(maxs[left], maxs[right])
+        return mins, maxs
+
+    def query(self, box_min, box_max, node_mins=None, node_maxs=None):
+        """ Indices into meshes whose box overlaps [box_min, box_max], rest pose unless refit() boxes are given. """
+        self._require_bvh()
+        if node_mins is None:
+            node_mins, node_maxs = self.bvh["mins"], self.bvh["maxs"]
+        box_min = np.asarray(box_min)
+        box_max = np.asarray(box_max)
+        found = []
+        stack = [0] if len(self.bvh) else []
+        while stack:
+            node = stack.pop()
+            if np.any(node_mins[node] > box_max) or np.any(node_maxs[node] < box_min):
+                continue
+            if self.bvh["phy"][node] >= 0:
+                found.append(int(self.bvh["phy"][node]))
+            else:
+                stack += [int(self.bvh["right"][node]), int(self.bvh["left"][node])]
+        return found
+
+#MANI
+mbonepos = np.dtype([
+    ("flags", "u1"),
+    ("boneIndex", "<u2"),
+    ("pos", "<f4", (3,)),
+    ("rot", "<f4", (3,)),   # euler XYZ
+    ("quat", "<f4", (4,)),  # same rotation as w, x, y, z
+])
+
+def _frame_bones(records):
+    # mbonepos array from (flags, bone, pos, rot, quat) records, fills whichever of rot/quat is None
+    bones = np.zeros(len(records), dtype=mbonepos)
+    for i, (flags, bone, pos, rot, quat) in enumerate(records):
+        bones[i]["flags"] = flags
+        bones[i]["boneIndex"] = bone
+        bones[i]["pos"] = pos
+        bones[i]["rot"] = rot if rot is not None else quaternion_to_euler(quat)
+        bones[i]["quat"] = quat if quat is not None else euler_to_quaternion(rot)
+    return bones
+
+class AnimFrame:
+    def __init__(self, frame, bones, flags=0, bone_mask=None):
+        self.frame = frame
+        self.bones = bones          # mbonepos array, channels without a flag are 0
+        self.flags = flags          # MFRAMEFLAGS, always 0 before v2
+        self.bone_mask = bone_mask  # v2: (bone_count,) bool, True for bones with a record in this frame
+
+    @property
+    def snapshot(self):
+        return bool(self.flags & structs.MFRAMEFLAGS.SNAPSHOT)
+
+class AnimSequence:
+    """
+    v1 sequences are decoded when the file is opened. v2 sequences decode a frame only when it is asked for,
+    through the frame offset table.
+    """
+    def __init__(self, header, frames=None, file=None, frame_offsets=None, snapshots=None, snapshot_interval=0,
+                 encoding=structs.MANIENCODING.HALF, bits=16, ranges=None, bone_count=0):
+        self.header = header
+        self.name = _name(header)
+        self.index = int(header["index"])
+        self.fps = int(header["fps"])
+        self.file = file
+        self.frame_offsets = frame_offsets          # v2: file offset of every stored frame
+        self.snapshots = snapshots                  # v2: stored frame indices of the snapshot frames
+        self.snapshot_interval = snapshot_interval  # v2: frames between snapshots, 0 = only the first one
+        self.encoding = encoding                    # MANIENCODING
+        self.bits = bits                            # quantized only, bits per value
+        self.ranges = ranges                        # quantized only, (2, bone_count) mchanrange_st: delta frames, snapshot frames
+        self.bone_count = bone_count                # v2: bits in every frame's bone mask
+        self._frames = frames
+
+    def __len__(self):
+        return len(self._frames) if self._frames is not None else len(self.frame_offsets)
+
+    def frame(self, i):
+        if self._frames is not None:
+            return self._frames[i]
+        return self.file._read_frame(int(self.frame_offsets[i]), self)[0]
+
+    @property
+    def frames(self):
+        if self._frames is None:
+            self._frames = [self.frame(i) for i in range(len(self.frame_offsets))]
+        return self._frames
+
+    def seek(self, frame):
+        """
+        Stored frames a runtime has to apply to reach frame: from the last snapshot at or before it up to
+        the first stored frame at or after it. Bounded by the snapshot interval for v2 files, v1 replays
+        from the start.
+        """
+        count = len(self)
+        if count == 0:
+            return []
+        start = 0
+        if self.snapshots is not None and len(self.snapshots) > 0:
+            first = self.frame(0).frame
+            slot = (frame - first) // self.snapshot_interval if self.snapshot_interval > 0 else 0
+            start = int(self.snapshots[min(max(slot, 0), len(self.snapshots) - 1)])
+        frames = []
+        for i in range(start, count):
+            frames.append(self.frame(i))
+            if frames[-1].frame >= frame:
+                break
+        return frames
+
+class MANIFile(MappedFile):
+    """
+    v1 frames carry no record count, so frame boundaries are recovered from the data:
+    records inside a frame have increasing boneIndex and frame numbers are increasing.
+    Frames may be sparse, a runtime interpolates the ones that are not stored.
+    Pass bone_count (madl_st.bone_count) to make that detection stricter.
+    v2 frames are self-delimiting and found through the per-sequence frame offset table. v2 files also have
+    a sequence directory, a sequence is only parsed when it is first asked for.
+    """
+    magic = structs.MANI_ID
+    header_st = structs.mani_st
+
+    def __init__(self, path, bone_count=None):
+        super().__init__(path)
+        self.bone_count = bone_count
+        self.directory = None   # v2: mseqdir_st per sequence
+        self._sequences = {}
+        if self.version >= 2:
+            dir_offset = int(self.array("<i4", 1, self.header_st.itemsize)[0])
+            self.directory = self.array(structs.mseqdir_st, int(self.header["num_sequences"]), dir_offset)
+            self.names = [_name(entry) for entry in self.directory]
+            return
+
+        off = int(self.header["seq_offset"])
+        for i in range(int(self.header["num_sequences"])):
+            if off + structs.manimseq_st.itemsize > self.size:
+                break
+            head = self.record(structs.manimseq_st, off)
+            frames, off = self._read_frames(off + structs.manimseq_st.itemsize)
+            self._sequences[i] = AnimSequence(head, frames)
+        self.names = [self._sequences[i].name for i in range(len(self._sequences))]
+
+    def __len__(self):
+        return len(self.names)
+
+    def sequence(self, key):
+        """ Sequence by position or by name. """
+        i = self.names.index(key) if isinstance(key, str) else key
+        if i not in self._sequences:
+            if self.directory is None or not 0 <= i < len(self.directory):
+                raise IndexError(f"{self.path}: no sequence {key!r}.")
+            self._sequences[i] = self._read_sequence(int(self.directory[i]["offset"]))
+        return self._sequences[i]
+
+    @property
+    def sequences(self):
+        return [self.sequence(i) for i in range(len(self))]
+
+    def _read_sequence(self, off):
+        head = self.record(structs.manimseq_st, off)
+        off += structs.manimseq_st.itemsize
+        ext = self.record(structs.manimseqext_st, off)
+        off += structs.manimseqext_st.itemsize
+        snapshots = self.array("<i4", int(ext["numSnapshots"]), off)
+        off += snapshots.nbytes
+        frame_offsets = self.array("<i4", int(head["numFrames"]), off)
+        off += frame_offsets.nbytes
+        ranges = self.array(structs.mchanrange_st, int(ext["numRanges"]), off)
+        ranges = ranges.reshape(2, -1) if len(ranges) else None
+        return AnimSequence(head, None, self, frame_offsets, snapshots, int(ext["snapshot_interval"]),
+                            int(ext["encoding"]), int(ext["bits"]), ranges, int(ext["boneCount"]))
+
+    def _decode_record(self, off, head_st=structs.mbonepos_head_st):
+        head = self.record(head_st, off)
+        flags, bone = int(head["flags"]), int(head["boneIndex"])
+        off += head_st.itemsize
+        channels = bin(flags).count("1")
+        values = self.array("<f2", channels, off)
+        pos = [0.0, 0.0, 0.0]
+        rot = [0.0, 0.0, 0.0]
+        channel = 0
+        for bit in range(6):
+            if flags & (1 << bit):
+                (pos if bit < 3 else rot)[bit % 3] = float(values[channel])
+                channel += 1
+        return (flags, bone, pos, rot, None), off + channels * 2
+
+    def _decode_quantized_record(self, off, sequence, snapshot):
+        head = self.record(structs.mbonepos_head_st, off)
+        flags, bone = int(head["flags"]), int(head["boneIndex"])
+        off += structs.mbonepos_head_st.itemsize
+        value_st = "u1" if sequence.bits <= 8 else "<u2"
+        value_size = np.dtype(value_st).itemsize
+        scale = sequence.ranges[1 if snapshot else 0][bone]
+        pos = [0.0, 0.0, 0.0]
+        for axis in range(3):
+            if flags & (1 << axis):
+                pos[axis] = float(scale["pos_min"][axis]) + float(self.array(value_st, 1, off)[0]) * float(scale["pos_step"][axis])
+                off += value_size
+        quat = np.array([1.0, 0.0, 0.0, 0.0])
+        if flags & 0x38:
+            largest = self.buffer[off]
+            three = scale["rot_min"] + self.array(value_st, 3, off + 1).astype(np.float64) * scale["rot_step"]
+            quat = from_smallest_three(largest, three)
+            off += 1 + 3 * value_size
+        return (flags, bone, pos, None, quat), off
+
+    def _read_frame(self, off, sequence):
+        # v2 manimdata_st, returns (AnimFrame, end offset)
+        head = self.record(structs.manimdata_st, off)
+        off += structs.manimdata_st.itemsize
+        mask_size = (sequence.bone_count + 7) // 8
+        bone_mask = np.unpackbits(self.array("u1", mask_size, off), count=sequence.bone_count, bitorder="little").astype(bool)
+        off += mask_size
+        snapshot = bool(head["flags"] & structs.MFRAMEFLAGS.SNAPSHOT)
+        records = []
+        for _ in range(int(head["numBones"])):
+            if sequence.encoding == structs.MANIENCODING.QUANTIZED:
+                rec, off = self._decode_quantized_record(off, sequence, snapshot)
+            else:
+                rec, off = self._decode_record(off)
+            records.append(rec)
+        return AnimFrame(int(head["frame"]), _frame_bones(records), int(head["flags"]), bone_mask), off
+
+    def bone_masks(self, sequence):
+        """ (stored frames, bone_count) bool, which bones have a record in which frame, without decoding any record. """
+        mask_size = (sequence.bone_count + 7) // 8
+        masks = np.zeros((len(sequence.frame_offsets), mask_size), dtype=np.uint8)
+        for i, off in enumerate(sequence.frame_offsets):
+            masks[i] = self.array("u1", mask_size, int(off) + structs.manimdata_st.itemsize)
+        return np.unpackbits(masks, axis=1, count=sequence.bone_count, bitorder="little").astype(bool)
+
+    def _read_record(self, off, prev_bone):
+        if off + 2 > self.size:
+            return None
+        flags, bone = self.buffer[off], self.buffer[off + 1]
+        if flags == 0 or flags & ~structs.MBONEFLAGS.ALL or bone <= prev_bone:
+            return None
+        if self.bone_count is not None and bone >= self.bone_count:
+            return None
+        channels = bin(flags).count("1")
+        if off + 2 + channels * 2 > self.size:
+            return None
+        return self._decode_record(off, structs.mbonepos_head_v1_st)
+
+    def _read_frames(self, off):
+        frames = []
+        last = None
+        while off + 2 <= self.size:
+            frame = int(self.array("<i2", 1, off)[0])
+            if last is not None and frame <= last:
+                break
+            off += 2
+            bones = []
+            prev_bone = -1
+            while True:
+                rec = self._read_record(off, prev_bone)
+                if rec is None:
+                    break
+                rec, off = rec
+                bones.append(rec)
+                prev_bone = rec[1]
+            frames.append(AnimFrame(frame, _frame_bones(bones)))
+            last = frame
+        return frames, off
+
+def open_madl(path):
+    return MADLFile(path)
+
+def open_mtex(path):
+    return MTEXFile(path)
+
+def open_mphy(path):
+    return MPHYFile(path)
+
+def open_mani(path, bone_count=None):
+    return MANIFile(path, bone_count)
+
+class Model:
+    """
+    MADL together with whichever of its MTEX/MPHY/MANI siblings exist next to it.
+    """
+    def __init__(self, path):
+        base = os.path.splitext(path)[0] + "."
+        self.madl = MADLFile(base + "madl")
+        self.mtex = MTEXFile(base + "mtex") if os.path.exists(base + "mtex") else None
+        self.mphy = MPHYFile(base + "mphy") if os.path.exists(base + "mphy") else None
+        self.mani = MANIFile(base + "mani", len(self.madl.bones)) if os.path.exists(base + "mani") else None
+        for part in (self.mtex, self.mphy, self.mani):
+            if part is not None and part.checksum != self.madl.checksum:
+                self.close()
+                raise ValueError(f"{part.path}: checksum does not match {self.madl.path}.")
+
+    def close(self):
+        for part in (self.madl, self.mtex, self.mphy, self.mani):
+            if part is not None:
+                part.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_model(path):
+    return Model(path)
@@ -0,0 +1,118 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+"""
+CPU linear blend skinning of MADL dynamic meshes.
+
+Vertices are converted once into padded (N, 4) bone/weight arrays sorted by influence count, so every
+group of vertices with the same count is skinned with one vectorized blend and no padding work.
+Vertices are in the rig's armature space (v2 exporter), the space of Skeleton.rest_matrices, and matrices
+are skinning matrices (pose @ inverse rest), see PoseEvaluator.skinning_matrices().
+"""
+
+import concurrent.futures
+import os
+
+import numpy as np
+
+from .reader import MADLFile
+
+MAX_INFLUENCES = 4
+
+class SkinnedMesh:
+    """
+    Dynamic mesh prepared for skinning. Vertices with more than max_influences bones keep the largest
+    weights, weights are normalized, vertices with no (valid) weight stay in their rest position.
+    """
+    def __init__(self, arrays, name="", max_influences=MAX_INFLUENCES):
+        self.name = name
+        positions = np.asarray(arrays["vert_position"], dtype=np.float32).reshape(-1, 3)
+        normals = np.asarray(arrays["vert_normal"], dtype=np.float32).reshape(-1, 3)
+        if len(positions):
+            bone = np.asarray(arrays["bone"], dtype=np.int32).reshape(len(positions), -1)
+            weight = np.asarray(arrays["weight"], dtype=np.float32).reshape(len(positions), -1)
+        else:
+            # No vertices, reshape(0, -1) cannot infer the influence count
+            bone = np.zeros((0, max_influences), dtype=np.int32)
+            weight = np.zeros((0, max_influences), dtype=np.float32)
+
+        # Vertex groups that are not bones were written as bone -1
+        weight = np.where((bone >= 0) & (weight > 0), weight, 0)
+        if weight.shape[1] < max_influences:
+            pad = max_influences - weight.shape[1]
+            weight = np.pad(weight, ((0, 0), (0, pad)))
+            bone = np.pad(bone, ((0, 0), (0, pad)))
+        strongest = np.argsort(-weight, axis=1, kind="stable")[:, :max_influences]
+        weight = np.take_along_axis(weight, strongest, axis=1)
+        bone = np.take_along_axis(bone, strongest, axis=1)
+        counts = (weight > 0).sum(axis=1)
+        total = weight.sum(axis=1, keepdims=True)
+        weight = np.where(total > 0, weight / np.where(total > 0, total, 1), 0).astype(np.float32)
+        bone = np.where(weight > 0, bone, 0).astype(np.int32)
+
+        self.order = np.argsort(counts, kind="stable")
+        self.inverse = np.empty_like(self.order)
+        self.inverse[self.order] = np.arange(len(self.order))
+        self.counts = counts[self.order]
+        self.bone = bone[self.order]
+        self.weight = weight[self.order]
+        self.positions = positions[self.order]
+        self.normals = normals[self.order]
+        self.bone_count = int(bone.max()) + 1 if len(bone) else 0
+        # (count, start, stop) ranges of self.bone/self.weight rows
+        bounds = np.searchsorted(self.counts, np.arange(max_influences + 2))
+        self.groups = [(count, int(bounds[count]), int(bounds[count + 1])) for count in range(max_influences + 1) if bounds[count] < bounds[count + 1]]
+
+    def __len__(self):
+        return len(self.positions)
+
+    @classmethod
+    def from_mesh(cls, mesh, max_influences=MAX_INFLUENCES):
+        return cls(mesh.arrays(), mesh.name, max_influences)
+
+    def skin(self, matrices, normals=True):
+        """
+        matrices: (bones, 4, 4) for one pose or (P, bones, 4, 4) for P poses.
+        Returns positions (N, 3) / (P, N, 3) in the original vertex order, and normals the same way
+        (None when normals=False).
+        """
+        matrices = np.asarray(matrices, dtype=np.float32)
+        if matrices.shape[-3] < self.bone_count:
+            raise ValueError(f"{self.name}: vertices use {self.bone_count} bones, got {matrices.shape[-3]} matrices.")
+        batch = matrices.shape[:-3]
+        rows = matrices[..., :3, :]
+        out_positions = np.empty(batch + self.positions.shape, dtype=np.float32)
+        out_normals = np.empty(batch + self.normals.shape, dtype=np.float32) if normals else None
+        for count, start, stop in self.groups:
+            if count == 0:
+                out_positions[..., start:stop, :] = self.positions[start:stop]
+                if normals:
+                    out_normals[..., start:stop, :] = self.normals[start:stop]
+                continue
+            # Weighted sum of the (3, 4) rows of every influencing bone: (..., n, 3, 4)
+            blended = np.einsum("...nkij,nk->...nij", rows[..., self.bone[start:stop, :count], :, :], self.weight[start:stop, :count])
+            out_positions[..., start:stop, :] = np.einsum("...nij,nj->...ni", blended[..., :3], self.positions[start:stop]) + blended[..., 3]
+            if normals:
+                # Bones are rigid, so the blended rotation is good enough for normals once renormalized
+                skinned = np.einsum("...nij,nj->...ni", blended[..., :3], self.normals[start:stop])
+                length = np.linalg.norm(skinned, axis=-1, keepdims=True)
+                out_normals[..., start:stop, :] = skinned / np.where(length > 0, length, 1)
+        out_positions = out_positions[..., self.inverse, :]
+        if normals:
+            out_normals = out_normals[..., self.inverse, :]
+        return out_positions, out_normals
+
+def prepare(madl, max_influences=MAX_INFLUENCES):
+    """ SkinnedMesh for every dynamic mesh of a MADLFile (or a list of DynamicMesh). """
+    meshes = madl.dynamic_meshes if isinstance(madl, MADLFile) else madl
+    return [SkinnedMesh.from_mesh(mesh, max_influences) for mesh in meshes]
+
+def skin_meshes(meshes, matrices, normals=True, workers=1):
+    """
+    Skin several SkinnedMesh with the same matrices, returns a list of (positions, normals).
+    workers > 1 splits meshes over a thread pool (NumPy releases the GIL), 0 = one per CPU core.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(meshes) < 2:
+        return [mesh.skin(matrices, normals) for mesh in meshes]
+    with concurrent.futures.ThreadPoolExecutor(min(workers, len(meshes))) as executor:
+        return list(executor.map(lambda mesh: mesh.skin(matrices, normals), meshes))
@@ -0,0 +1,205 @@
+# Made by Spalishe for github.com/Spalishe/MADL
+
+""" Binary layouts, see https://github.com/Spalishe/MADL/blob/main/MADL specification.txt"""
+
+import functools
+
+import numpy as np
+
+MADL_ID = b"MADL"
+MTEX_ID = b"MTEX"
+MPHY_ID = b"MPHY"
+MANI_ID = b"MANI"
+MBVH_ID = b"MBVH"
+
+#MADL
+madl_st = np.dtype([
+    ("id", "S4"),
+    ("version", "<i4"),
+    ("checksum", "<i4"),
+    ("name", "S32"),
+    ("bone_count", "<i4"),
+    ("bone_offset", "<i4"),
+    ("static_mesh_count", "<i4"),
+    ("static_mesh_offset", "<i4"),
+    ("dynamic_mesh_count", "<i4"),
+    ("dynamic_mesh_offset", "<i4"),
+])
+
+mbone_st = np.dtype([
+    ("index", "<i4"),
+    ("name", "S32"),
+    ("parent", "<i4"),
+    ("bone_position", "<f4", (3,)),
+    ("bone_angle", "<f4", (4,)),
+])
+
+# mstmesh_st up to (and including) vertices_count
+mstmesh_st = np.dtype([
+    ("struct_size", "<i4"),
+    ("index", "<i4"),
+    ("name", "S32"),
+    ("parented", "u1"),
+    ("boneIndex", "<i4"),
+    ("position", "<f4", (3,)),
+    ("angle", "<f4", (3,)),
+    ("vertices_count", "<i4"),
+])
+
+m_stvert_st = np.dtype([
+    ("vert_position", "<f4", (3,)),
+    ("vert_normal", "<f4", (3,)),
+    ("vert_texcoord", "<f4", (2,)),
+])
+
+# mdynmesh_st up to (and including) vertices_count
+mdynmesh_st = np.dtype([
+    ("struct_size", "<i4"),
+    ("index", "<i4"),
+    ("name", "S32"),
+    ("vertices_count", "<i4"),
+])
+
+# Variable sized: the one definition of the record, its size included. Built once per numbones
+@functools.lru_cache(maxsize=None)
+def mdynvert_st(numbones):
+    return np.dtype([
+        ("struct_size", "<i4"),
+        ("numbones", "u1"),
+        ("weight", "<f4", (numbones,)),
+        ("bone", "<i4", (numbones,)),
+        ("vert_position", "<f4", (3,)),
+        ("vert_normal", "<f4", (3,)),
+        ("vert_texcoord", "<f4", (2,)),
+    ])
+
+#MTEX
+mtex_st = np.dtype([
+    ("id", "S4"),
+    ("version", "<i4"),
+    ("checksum", "<i4"),
+    ("tex_count", "<i4"),
+    ("tex_offset", "<i4"),
+])
+
+# mtexdata_st up to (and including) data_length
+mtexdata_st = np.dtype([
+    ("struct_size", "<i4"),
+    ("texture", "<i4"),
+    ("name", "S32"),
+    ("data_length", "<i4"),
+])
+
+#MPHY
+mphy_st = np.dtype([
+    ("id", "S4"),
+    ("version", "<i4"),
+    ("checksum", "<i4"),
+    ("phy_count", "<i4"),
+    ("phy_offset", "<i4"),
+])
+
+# mphysdata_st up to (and including) vertices_count
+mphysdata_st = np.dtype([
+    ("struct_size", "<i4"),
+    ("index", "<i4"),
+    ("name", "S32"),
+    ("parented", "u1"),
+    ("boneIndex", "<i4"),
+    ("position", "<f4", (3,)),
+    ("angle", "<f4", (3,)),
+    ("vertices_count", "<i4"),
+])
+
+# Optional mphybounds_st after the last mphysdata_st
+mphybound_st = np.dtype([
+    ("mins", "<f4", (3,)),
+    ("maxs", "<f4", (3,)),
+    ("center", "<f4", (3,)),
+    ("radius", "<f4"),
+])
+
+mbvhnode_st = np.dtype([
+    ("mins", "<f4", (3,)),
+    ("maxs", "<f4", (3,)),
+    ("left", "<i4"),
+    ("right", "<i4"),
+    ("phy", "<i4"),
+])
+
+#MANI
+mani_st = np.dtype([
+    ("id", "S4"),
+    ("version", "<i4"),
+    ("checksum", "<i4"),
+    ("num_sequences", "<i4"),
+    ("seq_offset", "<i4"),
+])
+
+# v2+: directory entry, mani_st.dir_offset points to num_sequences of them
+mseqdir_st = np.dtype([
+    ("offset", "<i4"),
+    ("size", "<i4"),
+    ("name", "S32"),
+])
+
+# manimseq_st up to (and including) fps
+manimseq_st = np.dtype([
+    ("index", "<i4"),
+    ("name", "S32"),
+    ("numFrames", "<i4"),
+    ("fps", "u1"),
+])
+
+# v2+: follows manimseq_st, then int snapshots[numSnapshots], int frame_offsets[numFrames], mchanrange_st ranges[numRanges]
+manimseqext_st = np.dtype([
+    ("snapshot_interval", "<i4"),
+    ("numSnapshots", "<i4"),
+    ("encoding", "u1"),
+    ("bits", "u1"),
+    ("numRanges", "<i4"),
+    ("boneCount", "<i4"),
+])
+
+# v2+ quantized sequences: bone_count ranges for delta frames, then bone_count for snapshot frames
+mchanrange_st = np.dtype([
+    ("pos_min", "<f4", (3,)),
+    ("pos_step", "<f4", (3,)),
+    ("rot_min", "<f4"),
+    ("rot_step", "<f4"),
+])
+
+# v2+: manimdata_st up to (and including) numBones, then byte boneMask[(boneCount + 7) / 8]
+manimdata_st = np.dtype([
+    ("frame", "<i2"),
+    ("flags", "u1"),
+    ("numBones", "<u2"),
+])
+
+# mbonepos_t / mbonepos_q up to (and including) boneIndex. v1 has a byte boneIndex
+mbonepos_head_st = np.dtype([
+    ("flags", "u1"),
+    ("boneIndex", "<u2"),
+])
+
+mbonepos_head_v1_st = np.dtype([
+    ("flags", "u1"),
+    ("boneIndex", "u1"),
+])
+
+class MBONEFLAGS:
+    NOCHANGES = 0x0
+    POSX = 0x1
+    POSY = 0x2
+    POSZ = 0x4
+    ROTX = 0x8
+    ROTY = 0x10
+    ROTZ = 0x20
+    ALL = 0x3F
+
+class MFRAMEFLAGS:
+    SNAPSHOT = 0x1
+
+class MANIENCODING:
+    HALF = 0
+    QUANTIZED = 1